@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from types import SimpleNamespace
+
+import requests
+import stripe
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from library.metrics import observe_external_call
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class CircuitOpenError(PaymentGatewayError):
+    pass
+
+
+# Errors that leave the outcome of a charge unknown: Stripe may or may not
+# have charged the card. The charge has to be retried with the same
+# idempotency key rather than recorded as failed.
+TRANSIENT_ERRORS = (
+    stripe.error.APIConnectionError,
+    stripe.error.APIError,
+    stripe.error.IdempotencyError,
+    stripe.error.RateLimitError,
+    PaymentGatewayError,
+)
+
+
+class CircuitBreaker:
+    """Fail fast after repeated gateway outages.
+
+    After failure_threshold consecutive failures the circuit opens and
+    calls are rejected for reset_timeout seconds. The first call after
+    that is let through; its outcome closes or re-opens the circuit. Any
+    answer from Stripe, including an error such as a declined card,
+    counts as a success.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def call(self, func, *args, **kwargs):
+        with self._lock:
+            if self.opened_at is not None:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Payment gateway is unavailable")
+                self.opened_at = time.monotonic()
+
+        try:
+            result = func(*args, **kwargs)
+        except (stripe.error.APIConnectionError, stripe.error.APIError):
+            self._record_failure()
+            raise
+        except PaymentGatewayError:
+            self._record_failure()
+            raise
+        except stripe.error.StripeError:
+            # Stripe answered, e.g. with a declined card, so it is reachable.
+            self._record_success()
+            raise
+
+        self._record_success()
+        return result
+
+    def _record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def _record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class PaymentGateway(ABC):
+    """Charges and refunds behind a circuit breaker, with call metrics.
+
+    Subclasses implement the calls to the payment provider.
+    """
+
+    service = "payment_gateway"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, **options):
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def create_payment_intent(self, amount, currency, idempotency_key=None):
+        with observe_external_call(self.service, "create_payment_intent"):
+            return self.breaker.call(
+                self._create_payment_intent, amount, currency, idempotency_key
+            )
+
+    def refund(self, payment_intent_id):
+        with observe_external_call(self.service, "refund"):
+            return self.breaker.call(self._refund, payment_intent_id)
+
+    @abstractmethod
+    def _create_payment_intent(self, amount, currency, idempotency_key):
+        """Create and confirm a card payment intent."""
+
+    @abstractmethod
+    def _refund(self, payment_intent_id):
+        """Refund a payment intent in full."""
+
+
+class StripeGateway(PaymentGateway):
+    """Stripe API client with a keep-alive connection pool and timeouts."""
+
+    service = "stripe"
+
+    def __init__(
+        self,
+        connect_timeout=3,
+        read_timeout=10,
+        max_connections=10,
+        max_network_retries=1,
+        **options,
+    ):
+        super().__init__(**options)
+
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_connections, pool_block=True
+        )
+        session.mount("https://", adapter)
+
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY,
+            max_network_retries=max_network_retries,
+            http_client=stripe.RequestsClient(
+                timeout=(connect_timeout, read_timeout), session=session
+            ),
+        )
+
+    def _create_payment_intent(self, amount, currency, idempotency_key):
+        options = {"idempotency_key": idempotency_key} if idempotency_key else {}
+        return self.client.payment_intents.create(
+            params={
+                "amount": amount,
+                "currency": currency,
+                "payment_method_types": ["card"],
+                "payment_method": settings.STRIPE_PAYMENT_METHOD,
+                "confirm": True,
+            },
+            options=options,
+        )
+
+    def _refund(self, payment_intent_id):
+        return self.client.refunds.create(params={"payment_intent": payment_intent_id})
+
+
+class FakeGateway(PaymentGateway):
+    """In-process gateway for tests and offline load testing.
+
+    Every call sleeps for latency seconds. A failure_rate share of
+    charges is declined and an outage_rate share raises as if Stripe
+    could not be reached.
+    """
+
+    service = "fake_gateway"
+
+    def __init__(
+        self, latency=0.0, failure_rate=0.0, outage_rate=0.0, seed=None, **options
+    ):
+        super().__init__(**options)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.outage_rate = outage_rate
+        self.random = random.Random(seed)
+        self.intents = {}
+        self._lock = threading.Lock()
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.outage_rate:
+            raise PaymentGatewayError("Fake gateway outage")
+        return roll < self.outage_rate + self.failure_rate
+
+    def _create_payment_intent(self, amount, currency, idempotency_key):
+        with self._lock:
+            if idempotency_key in self.intents:
+                return self.intents[idempotency_key]
+
+        declined = self._call()
+        intent = SimpleNamespace(
+            id=f"pi_fake_{uuid.uuid4().hex}",
+            amount=amount,
+            currency=currency,
+            status="requires_payment_method" if declined else "succeeded",
+            last_payment_error=(
+                SimpleNamespace(message="Your card was declined.") if declined else None
+            ),
+        )
+
+        if idempotency_key:
+            with self._lock:
+                self.intents[idempotency_key] = intent
+        return intent
+
+    def _refund(self, payment_intent_id):
+        self._call()
+        return SimpleNamespace(
+            id=f"re_fake_{uuid.uuid4().hex}",
+            payment_intent=payment_intent_id,
+            status="succeeded",
+        )
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    """Return the process-wide gateway configured in PAYMENT_GATEWAY."""
+    options = dict(settings.PAYMENT_GATEWAY)
+    backend = import_string(options.pop("backend"))
+    return backend(**options)
@@ -0,0 +1,370 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from borrowings.gateways import get_gateway
+from borrowings.notifications import get_dispatcher
+from borrowings.models import Borrowing
+from library.models import Book
+from library_api_service.celery import app as celery_app
+from user.models import Profile
+
+PASSWORD = "synthetic"
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryCountingApp:
+    """WSGI wrapper that reports the number of DB queries in a header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers = [*headers, ("X-DB-Queries", str(queries))]
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(count):
+            return self.app(environ, counting_start_response)
+
+
+class Client:
+    """A user's HTTP session that records every request it sends."""
+
+    def __init__(self, base_url, user, seed):
+        self.base_url = base_url
+        self.user = user
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        token = RefreshToken.for_user(user).access_token
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.records = []
+
+    def request(self, name, method, path, expected=(200,), **kwargs):
+        started = time.perf_counter()
+        response = self.session.request(
+            method, self.base_url + path, allow_redirects=False, **kwargs
+        )
+        elapsed = time.perf_counter() - started
+        self.records.append(
+            (
+                name,
+                elapsed,
+                response.status_code in expected,
+                int(response.headers.get("X-DB-Queries", 0)),
+            )
+        )
+        return response
+
+
+def book_list(client, context):
+    client.request("book_list", "GET", "/api/library/books/")
+
+
+def book_search(client, context):
+    word = client.random.choice(["Silent", "River", "Shadow", "Garden", "Winter"])
+    client.request("book_search", "GET", "/api/library/books/", params={"search": word})
+
+
+def book_detail(client, context):
+    book_id = client.random.choice(context.book_ids)
+    client.request("book_detail", "GET", f"/api/library/books/{book_id}/")
+
+
+def borrowing_list(client, context):
+    client.request("borrowing_list", "GET", "/api/borrowings/borrowings/")
+
+
+def payment_list(client, context):
+    client.request("payment_list", "GET", "/api/borrowings/payments/")
+
+
+def login(client, context):
+    client.request(
+        "login",
+        "POST",
+        "/api/user/token/",
+        json={"email": client.user.email, "password": PASSWORD},
+    )
+
+
+def checkout(client, context):
+    """Borrow a book, pay for it and poll the payment status."""
+    today = date.today()
+    client.request(
+        "borrowing_create",
+        "POST",
+        "/api/borrowings/borrowings/",
+        expected=(302,),
+        json={
+            "book": client.random.choice(context.book_ids),
+            "borrow_date": str(today),
+            "expected_return_date": str(today + timedelta(days=7)),
+        },
+    )
+    borrowing = Borrowing.objects.filter(user=client.user).latest("id")
+
+    response = client.request(
+        "payment_create",
+        "POST",
+        "/api/borrowings/payments/",
+        expected=(202,),
+        json={
+            "borrowing": borrowing.id,
+            "card_number": 42424242,
+            "expiry_month": 12,
+            "expiry_year": 2030,
+            "cvc": 123,
+        },
+    )
+    if "Location" in response.headers:
+        client.request("payment_status", "GET", response.headers["Location"])
+
+
+SCENARIOS = {
+    "book_list": book_list,
+    "book_search": book_search,
+    "book_detail": book_detail,
+    "borrowing_list": borrowing_list,
+    "payment_list": payment_list,
+    "checkout": checkout,
+    "login": login,
+}
+
+
+def summarize(records, wall_time):
+    latencies = sorted(elapsed for _, elapsed, _, _ in records)
+    percentiles = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else []
+    )
+
+    def ms(seconds):
+        return round(seconds * 1000, 2)
+
+    return {
+        "requests": len(records),
+        "errors": sum(not ok for _, _, ok, _ in records),
+        "requests_per_second": round(len(records) / wall_time, 1),
+        "latency_ms": {
+            "mean": ms(statistics.fmean(latencies)),
+            "p50": ms(percentiles[49] if percentiles else latencies[0]),
+            "p95": ms(percentiles[94] if percentiles else latencies[0]),
+            "p99": ms(percentiles[98] if percentiles else latencies[0]),
+            "max": ms(latencies[-1]),
+        },
+        "db_queries_per_request": round(
+            statistics.fmean(queries for _, _, _, queries in records), 2
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API over HTTP with concurrent authenticated clients "
+        "against a seeded throwaway database, and write latency percentiles, "
+        "throughput and DB queries per request to a JSON report. Payments "
+        "and Telegram run against in-process fakes, so no network is needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Operations per scenario."
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=list(SCENARIOS),
+            help="Scenario to run, may be repeated. Runs all by default.",
+        )
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--books", type=int, default=5000)
+        parser.add_argument("--borrowings", type=int, default=50000)
+        parser.add_argument("--gateway-latency", type=float, default=0.05)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark-report.json")
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database and its data between runs.",
+        )
+
+    def handle(self, *args, **options):
+        creation = connection.creation
+        old_name = connection.settings_dict["NAME"]
+        creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"]
+        )
+        try:
+            with override_settings(
+                DEBUG=False,
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                    }
+                },
+                PAYMENT_GATEWAY={
+                    "backend": "borrowings.gateways.FakeGateway",
+                    "latency": options["gateway_latency"],
+                    "seed": options["seed"],
+                },
+                # Notifications are sent from the request in eager mode, so
+                # Telegram's pacing must not count towards API latency.
+                TELEGRAM={
+                    "transport": "borrowings.notifications.FakeTelegramTransport",
+                    "global_rate": 1000000,
+                    "chat_rate": 1000000,
+                },
+            ), mock.patch.dict(
+                # Daily request quotas would throttle the benchmark itself.
+                SimpleRateThrottle.THROTTLE_RATES,
+                {scope: None for scope in SimpleRateThrottle.THROTTLE_RATES},
+            ):
+                report = self.benchmark(options)
+        finally:
+            get_gateway.cache_clear()
+            get_dispatcher.cache_clear()
+            creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        with open(options["output"], "w") as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(f"Report written to {options['output']}")
+
+    def seed(self, options):
+        if not Book.objects.exists():
+            call_command(
+                "generate_data",
+                users=options["users"],
+                books=options["books"],
+                borrowings=options["borrowings"],
+                seed=options["seed"],
+                password=PASSWORD,
+                workers=1,
+                stdout=self.stdout,
+            )
+        # Checkouts must not run out of copies or skip the Telegram message.
+        Book.objects.update(inventory=1000000)
+        Profile.objects.update(telegram_chat_id="1")
+
+    def benchmark(self, options):
+        self.seed(options)
+        get_gateway.cache_clear()
+        get_dispatcher.cache_clear()
+        celery_app.conf.task_always_eager = True
+
+        users = list(get_user_model().objects.order_by("id")[: options["clients"]])
+        context = SimpleNamespace(
+            book_ids=list(Book.objects.values_list("id", flat=True)[:1000])
+        )
+        connection.close()
+
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        server.set_app(QueryCountingApp(get_internal_wsgi_application()))
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        results = {}
+        try:
+            for name in options["scenario"] or SCENARIOS:
+                results.update(
+                    self.run_scenario(
+                        SCENARIOS[name], base_url, users, context, options
+                    )
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+            celery_app.conf.task_always_eager = False
+
+        return {
+            "commit": self.current_commit(),
+            "clients": options["clients"],
+            "requests": options["requests"],
+            "dataset": {
+                "users": options["users"],
+                "books": options["books"],
+                "borrowings": options["borrowings"],
+                "seed": options["seed"],
+            },
+            "results": results,
+        }
+
+    def run_scenario(self, scenario, base_url, users, context, options):
+        clients = [
+            Client(base_url, user, options["seed"] + i) for i, user in enumerate(users)
+        ]
+        local = threading.local()
+        counter = iter(range(len(clients)))
+        lock = threading.Lock()
+
+        def assign_client():
+            with lock:
+                local.client = clients[next(counter)]
+
+        def operation(_):
+            scenario(local.client, context)
+            connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(len(clients), initializer=assign_client) as executor:
+            list(executor.map(operation, range(options["requests"])))
+        wall_time = time.perf_counter() - started
+
+        by_name = {}
+        for client in clients:
+            for record in client.records:
+                by_name.setdefault(record[0], []).append(record)
+
+        results = {}
+        for name, records in by_name.items():
+            results[name] = summarize(records, wall_time)
+            summary = results[name]
+            self.stdout.write(
+                f"{name:16} {summary['requests_per_second']:8.1f} req/s  "
+                f"p50 {summary['latency_ms']['p50']:8.2f}ms  "
+                f"p99 {summary['latency_ms']['p99']:8.2f}ms  "
+                f"{summary['db_queries_per_request']:5.1f} queries  "
+                f"{summary['errors']} errors"
+            )
+        return results
+
+    @staticmethod
+    def current_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,155 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from borrowings.models import Borrowing, Payment, Fines
+from borrowings.serializers import (
+    BorrowingListSerializer,
+    PaymentListSerializer,
+    FinesListSerializer,
+    borrowing_list_values,
+    payment_list_values,
+    fines_list_values,
+)
+from library.models import Book
+from user.models import Profile
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare list serializers with their .values() fast path on "
+        "generated rows. The rows are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options["rows"])
+                self.run(user, options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        user = get_user_model().objects.create_user(
+            "benchmark@benchmark.com", first_name="Bench", last_name="Mark"
+        )
+        Profile.objects.create(user=user, first_name="Bench", last_name="Mark")
+
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Benchmark book {i}",
+                author=f"Benchmark author {i % 100}",
+                inventory=10,
+                daily_fee=Decimal("1.50"),
+            )
+            for i in range(rows // 10 or 1)
+        )
+
+        today = date.today()
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                borrow_date=today - timedelta(days=30),
+                expected_return_date=today - timedelta(days=i % 60),
+                returned=today if i % 3 else None,
+                paid=True,
+                fines_applied=Decimal("2.40") if i % 5 == 0 else None,
+                book=books[i % len(books)],
+                user=user,
+            )
+            for i in range(rows)
+        )
+
+        card = {"card_number": 4242, "expiry_month": 1, "expiry_year": 2030, "cvc": 1}
+        payments = Payment.objects.bulk_create(
+            Payment(
+                borrowing=borrowing,
+                user=user,
+                amount_paid=Decimal("45.00"),
+                stripe_payment_id=f"pi_{borrowing.id}",
+                **card,
+            )
+            for borrowing in borrowings
+        )
+        Fines.objects.bulk_create(
+            Fines(
+                borrowing=payment.borrowing,
+                payment=payment,
+                user=user,
+                fines_paid=Decimal("2.40"),
+                stripe_payment_id=f"pi_fines_{payment.borrowing_id}",
+                **card,
+            )
+            for payment in payments
+        )
+        return user
+
+    def run(self, user, repeat):
+        context = {"request": SimpleNamespace(user=user)}
+        renderer = JSONRenderer()
+        cases = [
+            (
+                Borrowing.objects.select_related("user__profile", "book"),
+                BorrowingListSerializer,
+                borrowing_list_values,
+            ),
+            (
+                Payment.objects.select_related("user__profile", "borrowing"),
+                PaymentListSerializer,
+                payment_list_values,
+            ),
+            (
+                Fines.objects.select_related("user__profile", "borrowing"),
+                FinesListSerializer,
+                fines_list_values,
+            ),
+        ]
+
+        for queryset, serializer_class, values_serializer in cases:
+            queryset = queryset.order_by("id")
+
+            def serialize():
+                return serializer_class(queryset, many=True, context=context).data
+
+            def serialize_values():
+                rows = values_serializer.values(queryset)
+                return values_serializer.to_representation(rows)
+
+            serializer_time, expected = self.measure(serialize, repeat)
+            values_time, data = self.measure(serialize_values, repeat)
+
+            if renderer.render(data) != renderer.render(expected):
+                raise CommandError(
+                    f"{serializer_class.__name__} fast path output differs"
+                )
+
+            self.stdout.write(
+                f"{serializer_class.__name__}: {len(data)} rows, "
+                f"serializer {serializer_time * 1000:.1f} ms, "
+                f"values {values_time * 1000:.1f} ms, "
+                f"{serializer_time / values_time:.1f}x faster"
+            )
+
+    @staticmethod
+    def measure(func, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,57 @@
+import random
+import time
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from borrowings.notifications import FakeTelegramTransport, NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Push a burst of notifications through the dispatcher against a fake "
+        "Telegram that enforces the real rate limits, and report throughput, "
+        "coalescing and 429 answers. No network is needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--chats", type=int, default=500)
+        parser.add_argument("--latency", type=float, default=0.05)
+        parser.add_argument("--global-rate", type=float, default=30)
+        parser.add_argument("--chat-rate", type=float, default=1)
+        parser.add_argument("--max-connections", type=int, default=8)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        transport = FakeTelegramTransport(
+            latency=options["latency"],
+            global_rate=options["global_rate"],
+            chat_rate=options["chat_rate"],
+        )
+        dispatcher = NotificationDispatcher(
+            transport,
+            global_rate=options["global_rate"],
+            chat_rate=options["chat_rate"],
+            max_connections=options["max_connections"],
+        )
+        rng = random.Random(options["seed"])
+
+        started = time.perf_counter()
+        futures = [
+            dispatcher.submit(rng.randrange(options["chats"]), f"Notification {i}")
+            for i in range(options["messages"])
+        ]
+        done, _ = wait(futures)
+        elapsed = time.perf_counter() - started
+
+        failed = sum(future.exception() is not None for future in done)
+        requests = len(transport.sent)
+        self.stdout.write(
+            f"{options['messages']} messages in {requests} requests "
+            f"({options['messages'] / max(requests, 1):.1f} per request), "
+            f"{elapsed:.1f}s\n"
+            f"{options['messages'] / elapsed:.1f} messages/s, "
+            f"{requests / elapsed:.1f} requests/s\n"
+            f"{transport.rejected} answered 429, {failed} failed"
+        )
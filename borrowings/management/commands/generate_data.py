@@ -0,0 +1,405 @@
+import io
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from borrowings.models import Borrowing, Payment, Fines
+from borrowings.utils import FINE_MULTIPLIER
+from library.models import Book
+from user.models import Profile
+
+CHUNK_SIZE = 100000
+COPY_BATCH = 20000
+HISTORY_DAYS = 3 * 365
+NULL = r"\N"
+CENT = Decimal("0.01")
+
+FIRST_NAMES = (
+    "Olivia Liam Emma Noah Ava Mateo Sofia Lucas Mia Elijah Amara Yusuf Hana Ivan"
+).split()
+LAST_NAMES = (
+    "Smith Garcia Kowalski Nguyen Okafor Schmidt Rossi Tanaka Silva Novak Haddad"
+).split()
+WORDS = (
+    "Silent River Shadow Garden Winter Empire Glass Ocean Stone Night Golden Moon"
+).split()
+
+USER_COLUMNS = (
+    "id",
+    "password",
+    "last_login",
+    "is_superuser",
+    "is_staff",
+    "is_active",
+    "date_joined",
+    "email",
+    "first_name",
+    "last_name",
+    "bio",
+)
+PROFILE_COLUMNS = (
+    "id",
+    "user_id",
+    "first_name",
+    "last_name",
+    "bio",
+    "image",
+    "telegram_chat_id",
+)
+BOOK_COLUMNS = ("id", "title", "author", "inventory", "daily_fee", "cover")
+BORROWING_COLUMNS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "returned",
+    "cancelled",
+    "paid",
+    "payment_id",
+    "stripe_payment_id",
+    "fines_applied",
+    "fines_paid",
+    "book_id",
+    "user_id",
+)
+PAYMENT_COLUMNS = (
+    "id",
+    "card_number",
+    "expiry_month",
+    "expiry_year",
+    "cvc",
+    "amount_paid",
+    "stripe_payment_id",
+    "status",
+    "error",
+    "refunded",
+    "fines_id",
+    "borrowing_id",
+    "user_id",
+    "created_at",
+)
+FINES_COLUMNS = (
+    "id",
+    "card_number",
+    "expiry_month",
+    "expiry_year",
+    "cvc",
+    "fines_paid",
+    "stripe_payment_id",
+    "status",
+    "error",
+    "payment_id",
+    "borrowing_id",
+    "user_id",
+    "created_at",
+)
+
+
+def daily_fee(book_index):
+    """Fee of the n-th generated book, from 0.50 to 4.99."""
+    return Decimal(50 + book_index * 7919 % 450) / 100
+
+
+def value(item):
+    if item is None:
+        return NULL
+    if item is True:
+        return "t"
+    if item is False:
+        return "f"
+    return str(item)
+
+
+def copy_rows(cursor, model, columns, rows):
+    """COPY rows into the model's table in batches of COPY_BATCH rows."""
+    sql = f'COPY "{model._meta.db_table}" ({", ".join(columns)}) FROM STDIN'
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write("\t".join(map(value, row)))
+        buffer.write("\n")
+        count += 1
+        if count % COPY_BATCH == 0:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            buffer = io.StringIO()
+    if count % COPY_BATCH:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+    return count
+
+
+def user_rows(rng, plan, start, stop):
+    joined = plan["now"]
+    for i in range(start, stop):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        yield (
+            plan["user_base"] + i,
+            plan["password"],
+            None,
+            False,
+            False,
+            True,
+            joined,
+            f"user{plan['user_base'] + i}@synthetic.test",
+            first_name,
+            last_name,
+            "",
+        )
+
+
+def profile_rows(rng, plan, start, stop):
+    for i in range(start, stop):
+        yield (
+            plan["profile_base"] + i,
+            plan["user_base"] + i,
+            rng.choice(FIRST_NAMES),
+            rng.choice(LAST_NAMES),
+            "",
+            None,
+            None,
+        )
+
+
+def book_rows(rng, plan, start, stop):
+    for i in range(start, stop):
+        title = " ".join(rng.sample(WORDS, 3))
+        yield (
+            plan["book_base"] + i,
+            f"{title} {plan['book_base'] + i}",
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            rng.randint(0, 20),
+            daily_fee(i),
+            rng.choice("HS"),
+        )
+
+
+def fine(days, fee):
+    return (days * fee * FINE_MULTIPLIER).quantize(CENT, ROUND_HALF_UP)
+
+
+def loan_rows(rng, plan, start, stop):
+    """Yield (borrowing, payment, fines) rows with realistic outcomes.
+
+    5% of checkouts are never paid and 2% of paid ones are refunded.
+    Loans that are due are mostly returned on time, 10% are returned
+    late and fined, and 5% are still out and accruing fines. Payment
+    and fines are None when the loan has none.
+    """
+    today = plan["today"]
+    for i in range(start, stop):
+        borrowing_id = plan["borrowing_base"] + i
+        payment_id = plan["payment_base"] + i
+        book = rng.randrange(plan["books"])
+        user_id = plan["user_base"] + rng.randrange(plan["users"])
+        fee = daily_fee(book)
+
+        duration = rng.randint(7, 30)
+        borrow_date = today - timedelta(days=rng.randint(0, HISTORY_DAYS))
+        expected = borrow_date + timedelta(days=duration)
+        paid = rng.random() < 0.95
+        cancelled = paid and rng.random() < 0.02
+        returned = fines = None
+        fines_paid = False
+
+        if paid and not cancelled:
+            roll = rng.random()
+            if expected >= today:
+                if roll < 0.3:
+                    returned = borrow_date + timedelta(days=rng.randint(1, duration))
+                    returned = min(returned, today)
+            elif roll < 0.85:
+                returned = borrow_date + timedelta(days=rng.randint(1, duration))
+            elif roll < 0.95:
+                returned = min(expected + timedelta(days=rng.randint(1, 30)), today)
+                fines = fine((returned - expected).days, fee)
+                fines_paid = rng.random() < 0.8
+            else:
+                fines = fine((today - expected).days, fee)
+
+        card = (42424242, rng.randint(1, 12), rng.randint(2025, 2030), 123)
+        stripe_id = f"pi_synthetic_{i}" if paid else None
+        borrowing = (
+            borrowing_id,
+            borrow_date,
+            expected,
+            returned,
+            cancelled,
+            paid,
+            payment_id if paid else None,
+            stripe_id,
+            fines,
+            fines_paid,
+            plan["book_base"] + book,
+            user_id,
+        )
+        payment = paid and (
+            payment_id,
+            *card,
+            fee * duration,
+            stripe_id,
+            Payment.SUCCEEDED,
+            "",
+            cancelled,
+            None,
+            borrowing_id,
+            user_id,
+            borrow_date,
+        )
+        fines_row = fines_paid and (
+            plan["fines_base"] + i,
+            *card,
+            fines,
+            f"pi_synthetic_fines_{i}",
+            Payment.SUCCEEDED,
+            "",
+            payment_id,
+            borrowing_id,
+            user_id,
+            returned,
+        )
+        yield borrowing, payment or None, fines_row or None
+
+
+def generate_users(cursor, rng, plan, start, stop):
+    copy_rows(cursor, get_user_model(), USER_COLUMNS, user_rows(rng, plan, start, stop))
+    copy_rows(cursor, Profile, PROFILE_COLUMNS, profile_rows(rng, plan, start, stop))
+
+
+def generate_books(cursor, rng, plan, start, stop):
+    copy_rows(cursor, Book, BOOK_COLUMNS, book_rows(rng, plan, start, stop))
+
+
+def generate_loans(cursor, rng, plan, start, stop):
+    loans = list(loan_rows(rng, plan, start, stop))
+    copy_rows(cursor, Borrowing, BORROWING_COLUMNS, (loan[0] for loan in loans))
+    copy_rows(cursor, Payment, PAYMENT_COLUMNS, (loan[1] for loan in loans if loan[1]))
+    copy_rows(cursor, Fines, FINES_COLUMNS, (loan[2] for loan in loans if loan[2]))
+
+
+GENERATORS = {
+    "users": generate_users,
+    "books": generate_books,
+    "borrowings": generate_loans,
+}
+
+
+def generate_chunk(task):
+    """Load one chunk in its own transaction.
+
+    Each chunk has its own random stream derived from the seed, so the
+    data does not depend on how many workers there are.
+    """
+    kind, start, plan = task
+    stop = min(start + CHUNK_SIZE, plan[kind])
+    rng = random.Random(f"{plan['seed']}:{kind}:{start}")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if plan["skip_triggers"]:
+            # The generated rows reference each other correctly, so skip
+            # the per-row foreign key triggers.
+            cursor.execute("SET LOCAL session_replication_role = replica")
+        GENERATORS[kind](cursor, rng, plan, start, stop)
+    return kind, stop - start
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a large, deterministic synthetic dataset of "
+        "users, books, borrowings, payments and fines for scale testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000000)
+        parser.add_argument("--books", type=int, default=200000)
+        parser.add_argument("--borrowings", type=int, default=20000000)
+        parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--password",
+            default="synthetic",
+            help="Password of every generated user. It is hashed only once.",
+        )
+
+    def handle(self, *args, **options):
+        if options["borrowings"] and not (options["users"] and options["books"]):
+            raise CommandError("Borrowings need --users and --books")
+
+        plan = {
+            "seed": options["seed"],
+            "users": options["users"],
+            "books": options["books"],
+            "borrowings": options["borrowings"],
+            "today": date.today(),
+            "now": timezone.now().isoformat(),
+            "password": make_password(options["password"]),
+            "user_base": self.next_id(get_user_model()),
+            "profile_base": self.next_id(Profile),
+            "book_base": self.next_id(Book),
+            "borrowing_base": self.next_id(Borrowing),
+            "payment_base": self.next_id(Payment),
+            "fines_base": self.next_id(Fines),
+            "skip_triggers": self.is_superuser(),
+        }
+
+        started = time.monotonic()
+        # Borrowings reference users and books, so those are committed first.
+        self.run(plan, ["users", "books"], options["workers"], started)
+        self.run(plan, ["borrowings"], options["workers"], started)
+
+        models = [get_user_model(), Profile, Book, Borrowing, Payment, Fines]
+        with connection.cursor() as cursor:
+            for model in models:
+                table = model._meta.db_table
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                    f'COALESCE(MAX(id), 1)) FROM "{table}"'
+                )
+                cursor.execute(f'ANALYZE "{table}"')
+
+        self.stdout.write(f"Done in {time.monotonic() - started:.1f}s")
+
+    @staticmethod
+    def is_superuser():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def next_id(model):
+        return (model.objects.aggregate(Max("id"))["id__max"] or 0) + 1
+
+    def run(self, plan, kinds, workers, started):
+        tasks = [
+            (kind, start, plan)
+            for kind in kinds
+            for start in range(0, plan[kind], CHUNK_SIZE)
+        ]
+        if not tasks:
+            return
+
+        if workers > 1:
+            # Children must open their own connections, not share ours.
+            connections.close_all()
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                self.report(pool.imap_unordered(generate_chunk, tasks), plan, started)
+        else:
+            self.report(map(generate_chunk, tasks), plan, started)
+
+    def report(self, results, plan, started):
+        done = {}
+        for kind, rows in results:
+            done[kind] = done.get(kind, 0) + rows
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{kind}: {done[kind]}/{plan[kind]} rows ({elapsed:.1f}s)"
+            )
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0021_alter_fines_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fines",
+            name="error",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="fines",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("succeeded", "Succeeded"),
+                    ("failed", "Failed"),
+                ],
+                default="succeeded",
+                max_length=9,
+            ),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="error",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("succeeded", "Succeeded"),
+                    ("failed", "Failed"),
+                ],
+                default="succeeded",
+                max_length=9,
+            ),
+        ),
+    ]
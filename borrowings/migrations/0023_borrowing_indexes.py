@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:51
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without locking the table against writes.
+    atomic = False
+
+    dependencies = [
+        ("borrowings", "0022_payment_status"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("returned__isnull", True)),
+                fields=["expected_return_date"],
+                name="borrowing_outstanding_due_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="borrowing",
+            index=models.Index(
+                condition=models.Q(("returned__isnull", True)),
+                fields=["user", "expected_return_date"],
+                name="borrowing_outstanding_user_idx",
+            ),
+        ),
+    ]
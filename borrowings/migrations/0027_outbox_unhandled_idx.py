@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowings", "0026_pending_charges"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="outboxevent",
+            index=models.Index(
+                condition=models.Q(("handled_at__isnull", True)),
+                fields=["published_at"],
+                name="outbox_unhandled_idx",
+            ),
+        ),
+    ]
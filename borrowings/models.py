@@ -1,5 +1,9 @@
+import uuid
+
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
 from library.models import Book
 
 
@@ -29,9 +33,33 @@ class Borrowing(models.Model):
 
     class Meta:
         ordering = ["id", "expected_return_date", "book"]
+        indexes = [
+            # Overdue borrowings, for the daily fines job.
+            models.Index(
+                fields=["expected_return_date"],
+                condition=Q(returned__isnull=True),
+                name="borrowing_outstanding_due_idx",
+            ),
+            # A user's current borrowings, for the list endpoint, and their
+            # overdue ones, for the Telegram bot.
+            models.Index(
+                fields=["user", "expected_return_date"],
+                condition=Q(returned__isnull=True),
+                name="borrowing_outstanding_user_idx",
+            ),
+        ]
 
 
 class Payment(models.Model):
+    PENDING = "pending"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
     card_number = models.IntegerField()
     expiry_month = models.IntegerField()
     expiry_year = models.IntegerField()
@@ -42,6 +70,8 @@ class Payment(models.Model):
         null=True,
     )
     stripe_payment_id = models.CharField(max_length=255, null=True)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=SUCCEEDED)
+    error = models.CharField(max_length=255, blank=True)
     refunded = models.BooleanField(default=False)
     fines = models.ForeignKey(
         "Fines", on_delete=models.PROTECT, related_name="payments", null=True
@@ -52,10 +82,21 @@ class Payment(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True
     )
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.user}: {self.amount_paid}\nfor {self.borrowing.book}"
 
+    class Meta:
+        indexes = [
+            # Charges still waiting for a worker, for the pending sweeper.
+            models.Index(
+                fields=["created_at"],
+                condition=Q(status="pending"),
+                name="payment_pending_idx",
+            ),
+        ]
+
 
 class Fines(models.Model):
     card_number = models.IntegerField()
@@ -68,6 +109,10 @@ class Fines(models.Model):
         null=True,
     )
     stripe_payment_id = models.CharField(max_length=255, null=True)
+    status = models.CharField(
+        max_length=9, choices=Payment.STATUS_CHOICES, default=Payment.SUCCEEDED
+    )
+    error = models.CharField(max_length=255, blank=True)
     payment = models.ForeignKey(
         Payment, on_delete=models.PROTECT, related_name="payment_fines", null=True
     )
@@ -78,9 +123,105 @@ class Fines(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True
     )
 
+    created_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
         return f"{self.fines_paid}, paid by {self.user}"
 
     class Meta:
         verbose_name = "fines"
         verbose_name_plural = "fines"
+        indexes = [
+            models.Index(
+                fields=["created_at"],
+                condition=Q(status="pending"),
+                name="fines_pending_idx",
+            ),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """A domain event, written in the transaction that caused it.
+
+    Events are published to the broker by the relay_outbox task once they
+    are committed, and handled at most once per id by consumers.
+    """
+
+    BORROWING_PAID = "borrowing_paid"
+    BORROWING_RETURNED = "borrowing_returned"
+    FINE_ASSESSED = "fine_assessed"
+    REFUND_ISSUED = "refund_issued"
+    TYPE_CHOICES = [
+        (BORROWING_PAID, "Borrowing paid"),
+        (BORROWING_RETURNED, "Borrowing returned"),
+        (FINE_ASSESSED, "Fine assessed"),
+        (REFUND_ISSUED, "Refund issued"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    type = models.CharField(max_length=32, choices=TYPE_CHOICES)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    handled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.type} {self.id}"
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            # Events still waiting for the relay.
+            models.Index(
+                fields=["created_at"],
+                condition=Q(published_at__isnull=True),
+                name="outbox_unpublished_idx",
+            ),
+            # Published events still waiting for a consumer, for redelivery.
+            models.Index(
+                fields=["published_at"],
+                condition=Q(handled_at__isnull=True),
+                name="outbox_unhandled_idx",
+            ),
+        ]
+
+
+class Reminder(models.Model):
+    """A due date or overdue notice, recorded before it is sent.
+
+    A borrowing gets each kind of reminder at most once, so the nightly
+    campaign can be rerun safely.
+    """
+
+    DUE_TOMORROW = "due_tomorrow"
+    OVERDUE = "overdue"
+    KIND_CHOICES = [
+        (DUE_TOMORROW, "Due tomorrow"),
+        (OVERDUE, "Overdue"),
+    ]
+
+    borrowing = models.ForeignKey(
+        Borrowing, on_delete=models.CASCADE, related_name="reminders"
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind}: {self.borrowing}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing", "kind"], name="unique_borrowing_reminder"
+            ),
+        ]
+        indexes = [
+            # Reminders still to be sent, for reruns of the campaign.
+            models.Index(
+                fields=["dispatched_at"],
+                condition=Q(sent_at__isnull=True),
+                name="reminder_unsent_idx",
+            ),
+        ]
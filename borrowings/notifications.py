@@ -0,0 +1,258 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from library.metrics import observe_external_call
+
+MAX_MESSAGE_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+
+
+class TelegramError(Exception):
+    pass
+
+
+class TelegramRetryAfter(TelegramError):
+    """Telegram answered 429 Too Many Requests."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many requests, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TelegramTransport:
+    """Bot API client with a keep-alive connection pool and timeouts."""
+
+    service = "telegram"
+
+    def __init__(
+        self,
+        bot_token,
+        connect_timeout=3,
+        read_timeout=10,
+        max_connections=8,
+        **options,
+    ):
+        self.url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_connections, pool_block=True
+        )
+        self.session.mount("https://", adapter)
+
+    def send_message(self, chat_id, text):
+        with observe_external_call(self.service, "send_message"):
+            response = self.session.post(
+                self.url, json={"chat_id": chat_id, "text": text}, timeout=self.timeout
+            )
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+
+            if response.status_code == 429:
+                parameters = body.get("parameters") or {}
+                raise TelegramRetryAfter(parameters.get("retry_after", 1))
+            if not body.get("ok"):
+                raise TelegramError(body.get("description") or response.reason)
+
+
+class FakeTelegramTransport:
+    """In-process Bot API for tests and offline load testing.
+
+    Every call sleeps for latency seconds. Like Telegram, it answers 429
+    to more than global_rate messages within a second, or to a chat
+    messaged again sooner than 1 / chat_rate seconds after the last time.
+    Both limits are enforced with a 10% tolerance, since Telegram's own
+    limits are not exact either.
+    """
+
+    service = "fake_telegram"
+
+    def __init__(self, latency=0.0, global_rate=30, chat_rate=1, **options):
+        self.latency = latency
+        self.global_rate = global_rate
+        self.chat_interval = 0.9 / chat_rate
+        self.sent = []
+        self.rejected = 0
+        self._recent = deque()
+        self._last_sent = {}
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        with observe_external_call(self.service, "send_message"):
+            if self.latency:
+                time.sleep(self.latency)
+
+            with self._lock:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 0.9:
+                    self._recent.popleft()
+                last_sent = self._last_sent.get(chat_id)
+                if len(self._recent) >= self.global_rate or (
+                    last_sent is not None and now - last_sent < self.chat_interval
+                ):
+                    self.rejected += 1
+                    raise TelegramRetryAfter(1)
+
+                self._recent.append(now)
+                self._last_sent[chat_id] = now
+                self.sent.append((chat_id, text))
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    reserve() takes a token and returns how long the caller has to wait
+    before using it, so waiting happens outside of the lock.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def pause(self, seconds):
+        """Hand out no token for the next seconds."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+def take_batch(messages):
+    """Split off the leading messages that fit into one Telegram message."""
+    length = len(messages[0][0])
+    count = 1
+    for text, _ in messages[1:]:
+        length += len(MESSAGE_SEPARATOR) + len(text)
+        if length > MAX_MESSAGE_LENGTH:
+            break
+        count += 1
+    return messages[:count], messages[count:]
+
+
+class NotificationDispatcher:
+    """Send Telegram messages from a pool of sender threads.
+
+    Sends are paced by a global token bucket and a minimum interval per
+    chat. Messages to a chat that queue up while it waits for its turn
+    are coalesced into a single message. A 429 answer pauses all sends
+    for the retry_after it carries, and the message is retried up to
+    max_retries times.
+    """
+
+    def __init__(
+        self,
+        transport,
+        global_rate=30,
+        chat_rate=1,
+        max_connections=8,
+        max_retries=3,
+        **options,
+    ):
+        self.transport = transport
+        self.bucket = TokenBucket(global_rate)
+        self.chat_interval = 1 / chat_rate
+        self.max_retries = max_retries
+
+        # A chat is in ready exactly once while it has pending messages.
+        self.pending = {}
+        self.ready = queue.Queue()
+        self.next_send = {}
+        self._lock = threading.Lock()
+
+        for _ in range(max_connections):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, chat_id, text):
+        """Queue a message; the returned future resolves once it is sent."""
+        future = Future()
+        with self._lock:
+            if chat_id in self.pending:
+                self.pending[chat_id].append((text, future))
+            else:
+                self.pending[chat_id] = [(text, future)]
+                self.ready.put(chat_id)
+        return future
+
+    def _reserve_chat(self, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            if len(self.next_send) > 10000:
+                self.next_send = {
+                    chat: at for chat, at in self.next_send.items() if at > now
+                }
+            send_at = max(now, self.next_send.get(chat_id, now))
+            self.next_send[chat_id] = send_at + self.chat_interval
+            return send_at - now
+
+    def _run(self):
+        while True:
+            chat_id = self.ready.get()
+            time.sleep(self._reserve_chat(chat_id))
+            time.sleep(self.bucket.reserve())
+
+            with self._lock:
+                batch, rest = take_batch(self.pending.pop(chat_id))
+                if rest:
+                    self.pending[chat_id] = rest
+                    self.ready.put(chat_id)
+
+            self._send(chat_id, batch)
+
+    def _send(self, chat_id, batch):
+        text = MESSAGE_SEPARATOR.join(text for text, _ in batch)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.transport.send_message(chat_id, text)
+            except TelegramRetryAfter as e:
+                error = e
+                # Telegram does not say which limit was hit, so back off
+                # everywhere rather than keep hitting it from other chats.
+                self.bucket.pause(e.retry_after)
+                if attempt < self.max_retries:
+                    time.sleep(self.bucket.reserve())
+            except Exception as e:
+                error = e
+                break
+            else:
+                error = None
+                break
+
+        for _, future in batch:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+
+@lru_cache(maxsize=None)
+def get_dispatcher():
+    """Return the process-wide dispatcher configured in TELEGRAM."""
+    options = dict(settings.TELEGRAM)
+    transport = import_string(options.pop("transport"))(**options)
+    return NotificationDispatcher(transport, **options)
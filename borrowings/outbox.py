@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from library_api_service.celery import app as celery_app
+from .models import OutboxEvent
+
+RELAY_BATCH_SIZE = 500
+# Published events still unhandled after this long are published again.
+REDELIVERY_TIMEOUT = timedelta(minutes=30)
+
+
+def record_event(event_type, **payload):
+    """Write an event to the outbox in the current transaction.
+
+    Nothing reaches the broker here: if the transaction rolls back, the
+    event is gone with it.
+    """
+    return OutboxEvent.objects.create(type=event_type, payload=payload)
+
+
+def publish_pending_events(batch_size=RELAY_BATCH_SIZE):
+    """Publish committed events in batches, oldest first.
+
+    Each batch is locked with SKIP LOCKED, so relays running side by side
+    never publish the same event, and marked as published only after it
+    has been sent. An event can be published again if the relay dies in
+    between, which consumers absorb by deduplicating on the event id.
+    Events published over REDELIVERY_TIMEOUT ago and still not handled,
+    because their message was lost or ran out of retries, are queued for
+    publishing again. Returns the number of published events.
+    """
+    from .tasks import handle_outbox_event
+
+    OutboxEvent.objects.filter(
+        handled_at__isnull=True,
+        published_at__lt=timezone.now() - REDELIVERY_TIMEOUT,
+    ).update(published_at=None)
+
+    published = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.filter(published_at__isnull=True)
+                .select_for_update(skip_locked=True)
+                .order_by("created_at")[:batch_size]
+            )
+            if not events:
+                break
+
+            with celery_app.producer_or_acquire() as producer:
+                for event in events:
+                    handle_outbox_event.apply_async(
+                        (str(event.id), event.type, event.payload),
+                        task_id=str(event.id),
+                        producer=producer,
+                    )
+
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                published_at=timezone.now()
+            )
+        published += len(events)
+        if len(events) < batch_size:
+            break
+    return published
+
+
+def claim_event(event_id):
+    """Mark an event as handled; False if it already was."""
+    return bool(
+        OutboxEvent.objects.filter(pk=event_id, handled_at__isnull=True).update(
+            handled_at=timezone.now()
+        )
+    )
@@ -0,0 +1,150 @@
+from concurrent.futures import wait
+from datetime import date, timedelta
+from itertools import islice
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Borrowing, Reminder
+from .notifications import get_dispatcher
+
+REMINDER_BATCH_SIZE = 500
+# Borrowings that went overdue while the campaign was not running still
+# get their notice, but the first run does not notify the whole backlog.
+OVERDUE_LOOKBACK = timedelta(days=7)
+# Dispatched reminders still unsent after this long are dispatched again.
+REDISPATCH_AFTER = timedelta(hours=6)
+
+MESSAGES = {
+    Reminder.DUE_TOMORROW: "{title} by {author} is due tomorrow, {due}.",
+    Reminder.OVERDUE: (
+        "{title} by {author} was due on {due}. Fines apply until it is returned."
+    ),
+}
+
+
+def reminder_candidates(kind, today=None):
+    """Outstanding borrowings of Telegram users still owed a reminder."""
+    today = today or date.today()
+    borrowings = Borrowing.objects.filter(
+        returned__isnull=True, user__profile__telegram_chat_id__isnull=False
+    )
+    if kind == Reminder.DUE_TOMORROW:
+        borrowings = borrowings.filter(expected_return_date=today + timedelta(days=1))
+    else:
+        borrowings = borrowings.filter(
+            expected_return_date__lt=today,
+            expected_return_date__gte=today - OVERDUE_LOOKBACK,
+        )
+    return borrowings.filter(
+        ~Exists(Reminder.objects.filter(borrowing=OuterRef("pk"), kind=kind))
+    )
+
+
+def unsent_reminders(today=None):
+    """Unsent reminders that still apply today.
+
+    A reminder recorded on an earlier night is dropped once its book is
+    returned, and a due tomorrow notice once that day has passed.
+    """
+    tomorrow = (today or date.today()) + timedelta(days=1)
+    return Reminder.objects.filter(
+        sent_at__isnull=True, borrowing__returned__isnull=True
+    ).exclude(
+        Q(kind=Reminder.DUE_TOMORROW) & ~Q(borrowing__expected_return_date=tomorrow)
+    )
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def record_reminders(today=None, batch_size=REMINDER_BATCH_SIZE):
+    """Record the reminders owed today. Returns how many were recorded.
+
+    Candidates skipped by the unique constraint are not counted: only
+    reminders created since this run started are.
+    """
+    started = timezone.now()
+    recorded = 0
+    for kind in MESSAGES:
+        ids = (
+            reminder_candidates(kind, today)
+            .order_by()
+            .values_list("id", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        for batch in batches(ids, batch_size):
+            Reminder.objects.bulk_create(
+                (Reminder(borrowing_id=pk, kind=kind) for pk in batch),
+                ignore_conflicts=True,
+            )
+            recorded += Reminder.objects.filter(
+                borrowing_id__in=batch, kind=kind, created_at__gte=started
+            ).count()
+    return recorded
+
+
+def dispatch_reminders(send, today=None, batch_size=REMINDER_BATCH_SIZE):
+    """Hand unsent reminders to send() in batches of ids.
+
+    Reminders of one user are kept together, so they can be sent as a
+    single message. Returns the number of batches.
+    """
+    now = timezone.now()
+    ids = (
+        unsent_reminders(today)
+        .exclude(dispatched_at__gte=now - REDISPATCH_AFTER)
+        .order_by("borrowing__user_id")
+        .values_list("id", flat=True)
+    )
+    count = 0
+    for batch in batches(list(ids), batch_size):
+        Reminder.objects.filter(pk__in=batch).update(dispatched_at=now)
+        send(batch)
+        count += 1
+    return count
+
+
+def send_reminder_batch(reminder_ids, today=None):
+    """Send one message per chat and mark the delivered reminders as sent.
+
+    Returns the number of reminders sent.
+    """
+    rows = (
+        unsent_reminders(today)
+        .filter(pk__in=reminder_ids)
+        .values_list(
+            "id",
+            "kind",
+            "borrowing__book__title",
+            "borrowing__book__author",
+            "borrowing__expected_return_date",
+            "borrowing__user__profile__telegram_chat_id",
+        )
+    )
+
+    by_chat = {}
+    for pk, kind, title, author, due, chat_id in rows:
+        ids, lines = by_chat.setdefault(chat_id, ([], []))
+        ids.append(pk)
+        lines.append(MESSAGES[kind].format(title=title, author=author, due=due))
+
+    dispatcher = get_dispatcher()
+    futures = {
+        dispatcher.submit(chat_id, "\n".join(lines)): ids
+        for chat_id, (ids, lines) in by_chat.items()
+    }
+    # Every send ends within its timeouts and retries, so this cannot hang.
+    wait(futures)
+
+    sent = [
+        pk
+        for future, ids in futures.items()
+        if future.exception() is None
+        for pk in ids
+    ]
+    Reminder.objects.filter(pk__in=sent).update(sent_at=timezone.now())
+    return len(sent)
@@ -1,9 +1,22 @@
 from datetime import date, datetime
+from types import SimpleNamespace
 
 from rest_framework import serializers
+from library.models import book_display
+from user.models import full_name
 from .models import Borrowing, Payment, Fines
 
 
+# Shared by the model serializers and the .values() serializers below, so
+# that both render the same strings.
+def user_display(first_name, last_name, email):
+    return f"{full_name(first_name, last_name)} ({email})"
+
+
+def borrowing_period(borrow_date, expected_return_date):
+    return f"from {borrow_date} to {expected_return_date}"
+
+
 class BorrowingSerializer(serializers.ModelSerializer):
     def validate_borrow_date(self, value):
         request = self.context.get("request")
@@ -47,11 +60,13 @@ class BorrowingListSerializer(BorrowingSerializer):
 
     @staticmethod
     def get_borrowed(obj):
-        return f"from {obj.borrow_date} to {obj.expected_return_date}"
+        return borrowing_period(obj.borrow_date, obj.expected_return_date)
 
     @staticmethod
     def get_user(obj):
-        return f"{obj.user.profile.full_name} ({obj.user.email})"
+        return user_display(
+            obj.user.profile.first_name, obj.user.profile.last_name, obj.user.email
+        )
 
     class Meta:
         model = Borrowing
@@ -76,7 +91,9 @@ class BorrowingDetailSerializer(BorrowingListSerializer):
 
     @staticmethod
     def get_user(obj):
-        return f"{obj.user.profile.full_name} ({obj.user.email})"
+        return user_display(
+            obj.user.profile.first_name, obj.user.profile.last_name, obj.user.email
+        )
 
     class Meta:
         model = Borrowing
@@ -96,6 +113,30 @@ class BorrowingDetailSerializer(BorrowingListSerializer):
         ]
 
 
+class BorrowingSummarySerializer(serializers.ModelSerializer):
+    book = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = Borrowing
+        fields = [
+            "id",
+            "book",
+            "borrow_date",
+            "expected_return_date",
+            "returned",
+            "fines_applied",
+            "fines_paid",
+        ]
+
+
+class LoanSummarySerializer(serializers.Serializer):
+    last_borrowing = BorrowingSummarySerializer(read_only=True, allow_null=True)
+    overdue = BorrowingSummarySerializer(many=True, read_only=True)
+    outstanding_fines = serializers.DecimalField(
+        max_digits=8, decimal_places=2, read_only=True
+    )
+
+
 class ReturnActionSerializer(BorrowingSerializer):
     to_return = serializers.ChoiceField(choices=["I return it"])
 
@@ -136,7 +177,9 @@ class PaymentListSerializer(PaymentSerializer):
 
     @staticmethod
     def get_user(obj):
-        return f"{obj.user.profile.full_name} ({obj.user.email})"
+        return user_display(
+            obj.user.profile.first_name, obj.user.profile.last_name, obj.user.email
+        )
 
     class Meta:
         model = Payment
@@ -180,6 +223,13 @@ class PaymentCreateSerializer(PaymentSerializer):
         ]
 
 
+class PaymentStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ["id", "borrowing", "amount_paid", "status", "error"]
+        read_only_fields = fields
+
+
 class RefundActionSerializer(PaymentSerializer):
     refund = serializers.ChoiceField(choices=["I want to refund my payment"])
 
@@ -221,7 +271,9 @@ class FinesListSerializer(FinesSerializer):
 
     @staticmethod
     def get_user(obj):
-        return f"{obj.user.profile.full_name} ({obj.user.email})"
+        return user_display(
+            obj.user.profile.first_name, obj.user.profile.last_name, obj.user.email
+        )
 
     class Meta:
         model = Fines
@@ -261,3 +313,97 @@ class FinesCreateSerializer(FinesSerializer):
             "cvc",
             "borrowing",
         ]
+
+
+class FinesStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Fines
+        fields = ["id", "borrowing", "fines_paid", "status", "error"]
+        read_only_fields = fields
+
+
+class ValuesListSerializer:
+    """Read-only fast path for rendering a list serializer.
+
+    Rows are read with queryset.values() and every field is rendered by an
+    accessor precomputed once from serializer_class, so there is no field
+    binding or per-object method dispatch. Fields that need related
+    objects are given in computed as (columns, function) pairs. The output
+    is identical to serializer_class(queryset, many=True).data.
+    """
+
+    def __init__(self, serializer_class, computed):
+        self.serializer_class = serializer_class
+        self.computed = computed
+        self._accessors = None
+
+    @property
+    def accessors(self):
+        if self._accessors is None:
+            self._accessors = self._compile()
+        return self._accessors
+
+    def _compile(self):
+        context = {"request": SimpleNamespace(user=None)}
+        fields = self.serializer_class(context=context).fields
+
+        accessors = []
+        for name, field in fields.items():
+            if name in self.computed:
+                columns, func = self.computed[name]
+                accessors.append((name, tuple(columns), func))
+            elif isinstance(field, serializers.RelatedField):
+                accessors.append((name, field.source, None))
+            else:
+                accessors.append((name, field.source, field.to_representation))
+        return accessors
+
+    def values(self, queryset):
+        columns = {}
+        for _, field_columns, _ in self.accessors:
+            if isinstance(field_columns, str):
+                field_columns = (field_columns,)
+            columns.update(dict.fromkeys(field_columns))
+        return queryset.values(*columns)
+
+    @property
+    def field_names(self):
+        return [name for name, _, _ in self.accessors]
+
+    def iter_representation(self, rows):
+        accessors = self.accessors
+        for row in rows:
+            item = {}
+            for name, columns, func in accessors:
+                if isinstance(columns, tuple):
+                    item[name] = func(*[row[column] for column in columns])
+                    continue
+
+                value = row[columns]
+                if func is not None and value is not None:
+                    value = func(value)
+                item[name] = value
+            yield item
+
+    def to_representation(self, rows):
+        return list(self.iter_representation(rows))
+
+
+USER_COLUMNS = ["user__profile__first_name", "user__profile__last_name", "user__email"]
+
+borrowing_list_values = ValuesListSerializer(
+    BorrowingListSerializer,
+    computed={
+        "user": (USER_COLUMNS, user_display),
+        "book": (["book__title", "book__author"], book_display),
+        "borrowed": (["borrow_date", "expected_return_date"], borrowing_period),
+    },
+)
+
+payment_list_values = ValuesListSerializer(
+    PaymentListSerializer, computed={"user": (USER_COLUMNS, user_display)}
+)
+
+fines_list_values = ValuesListSerializer(
+    FinesListSerializer, computed={"user": (USER_COLUMNS, user_display)}
+)
@@ -0,0 +1,51 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q, Subquery
+
+from .models import Borrowing
+
+
+class LoanSummary:
+    """A user's last borrowing, overdue borrowings and unpaid fines."""
+
+    def __init__(self, last_borrowing, overdue, outstanding_fines):
+        self.last_borrowing = last_borrowing
+        self.overdue = overdue
+        self.outstanding_fines = outstanding_fines
+
+
+def loan_summary(user_id, today=None):
+    """Build the summary of a user's loans with a single query.
+
+    Only the rows the summary needs are read: the latest borrowing, the
+    overdue ones and those with unpaid fines.
+    """
+    today = today or date.today()
+    latest = Borrowing.objects.filter(user_id=user_id).order_by("-id").values("id")[:1]
+    overdue = Q(expected_return_date__lt=today, returned__isnull=True)
+    unpaid_fines = Q(fines_applied__isnull=False, fines_paid=False)
+
+    borrowings = list(
+        Borrowing.objects.filter(user_id=user_id)
+        .filter(Q(pk=Subquery(latest)) | overdue | unpaid_fines)
+        .select_related("book")
+        .order_by("expected_return_date", "id")
+    )
+
+    return LoanSummary(
+        last_borrowing=max(borrowings, key=lambda b: b.id, default=None),
+        overdue=[
+            borrowing
+            for borrowing in borrowings
+            if borrowing.returned is None and borrowing.expected_return_date < today
+        ],
+        outstanding_fines=sum(
+            (
+                borrowing.fines_applied
+                for borrowing in borrowings
+                if borrowing.fines_applied is not None and not borrowing.fines_paid
+            ),
+            Decimal("0.00"),
+        ),
+    )
@@ -1,38 +1,120 @@
-from datetime import date
-import telebot
+from datetime import timedelta
+
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from celery import shared_task
+from django.db import transaction
 from django.urls import reverse_lazy
+from django.utils import timezone
 from rest_framework.response import Response
 
-from borrowings.models import Borrowing
-from borrowings.utils import calculate_fines
-from user.models import Profile
+from borrowings.gateways import TRANSIENT_ERRORS
+from borrowings.models import Payment, Fines, OutboxEvent
+from borrowings.notifications import get_dispatcher
+from borrowings.outbox import claim_event, publish_pending_events
+from borrowings.reminders import (
+    dispatch_reminders,
+    record_reminders,
+    send_reminder_batch,
+)
+from borrowings.utils import (
+    apply_overdue_fines,
+    stripe_card_payment,
+    finalize_payment,
+    finalize_fines,
+)
 
+# The notifications worker runs a thread pool, which cannot enforce task
+# time limits, so waiting for the message to be sent has to time out by
+# itself. Rate limits can hold a message back for a while during bursts.
+TELEGRAM_TIMEOUT = 60
 
-@shared_task
-def calculate_fines_daily():
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lt=date.today(), returned__isnull=True
+
+# A fines run is a single idempotent UPDATE, so it is safe to redeliver if
+# the worker dies halfway through.
+@shared_task(acks_late=True, soft_time_limit=20 * 60, time_limit=30 * 60)
+def calculate_fines_daily() -> dict:
+    return apply_overdue_fines()
+
+
+# Charges carry an idempotency key and skip records that are no longer
+# pending, so a redelivered message never charges the card twice. When
+# Stripe cannot be reached the outcome is unknown, so the record stays
+# pending and the charge is retried with the same key.
+@shared_task(
+    acks_late=True,
+    autoretry_for=TRANSIENT_ERRORS,
+    retry_backoff=5,
+    retry_backoff_max=5 * 60,
+    max_retries=8,
+    soft_time_limit=60,
+    time_limit=90,
+)
+def charge_payment(payment_id) -> str:
+    """Charge a pending borrowing payment outside of any transaction."""
+    payment = Payment.objects.get(pk=payment_id)
+    if payment.status != Payment.PENDING:
+        return payment.status
+
+    response = stripe_card_payment(
+        payment.amount_paid, idempotency_key=f"payment-{payment_id}"
     )
+    return finalize_payment(payment_id, response).status
 
-    for borrowing in overdue_borrowings:
-        fines = calculate_fines(borrowing.id)
-        if borrowing.fines_applied != fines:
-            borrowing.fines_applied = fines
-            borrowing.save()
+
+@shared_task(
+    acks_late=True,
+    autoretry_for=TRANSIENT_ERRORS,
+    retry_backoff=5,
+    retry_backoff_max=5 * 60,
+    max_retries=8,
+    soft_time_limit=60,
+    time_limit=90,
+)
+def charge_fines(fines_id) -> str:
+    """Charge pending fines outside of any transaction."""
+    fines = Fines.objects.get(pk=fines_id)
+    if fines.status != Payment.PENDING:
+        return fines.status
+
+    response = stripe_card_payment(
+        fines.fines_paid, idempotency_key=f"fines-{fines_id}"
+    )
+    return finalize_fines(fines_id, response).status
 
 
 @shared_task
+def retry_pending_charges() -> dict:
+    """Enqueue again the charges pending for over PENDING_CHARGE_TIMEOUT.
+
+    A charge is published after the checkout commits and can be lost on
+    the way, which would leave its copy reserved for good. The charge
+    tasks skip settled records and reuse the idempotency key, so a
+    charge that is merely slow is not made twice.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PENDING_CHARGE_TIMEOUT)
+    stale = {"status": Payment.PENDING, "created_at__lt": cutoff}
+    payment_ids = list(Payment.objects.filter(**stale).values_list("id", flat=True))
+    fines_ids = list(Fines.objects.filter(**stale).values_list("id", flat=True))
+
+    for payment_id in payment_ids:
+        charge_payment.delay(payment_id)
+    for fines_id in fines_ids:
+        charge_fines.delay(fines_id)
+    return {"payments": len(payment_ids), "fines": len(fines_ids)}
+
+
+# Acknowledged on receipt: a redelivered notification would send the
+# reader a duplicate message.
+@shared_task(acks_late=False, soft_time_limit=90, time_limit=120)
 def notify_about_borrowing_create(
     borrowing_id, user_id
 ) -> int | Exception | str | Response:
     from .models import Borrowing
 
     try:
-        borrowing = Borrowing.objects.get(pk=borrowing_id)
-        user = get_user_model().objects.get(pk=user_id)
+        borrowing = Borrowing.objects.select_related("book", "user__profile").get(
+            pk=borrowing_id, user_id=user_id
+        )
         borrowing_url = reverse_lazy(
             "borrowings:borrowings-detail", kwargs={"pk": borrowing_id}
         )
@@ -45,12 +127,70 @@ def notify_about_borrowing_create(
             f"View details: {settings.BASE_URL}{borrowing_url}"
         )
 
-        bot = telebot.TeleBot(settings.TELEGRAM["bot_token"])
-        profile = Profile.objects.get(user=user)
-        chat_id = profile.telegram_chat_id
+        chat_id = borrowing.user.profile.telegram_chat_id
 
         if chat_id:
-            bot.send_message(chat_id, notification_message)
+            get_dispatcher().submit(chat_id, notification_message).result(
+                TELEGRAM_TIMEOUT
+            )
 
     except Exception as e:
         return str(e)
+
+
+# Recording is idempotent and reminders are dispatched at most once every
+# few hours, so a redelivered run sends nothing twice.
+@shared_task(acks_late=True, soft_time_limit=20 * 60, time_limit=30 * 60)
+def schedule_reminders() -> dict:
+    """Record tonight's due date and overdue reminders and fan them out."""
+    recorded = record_reminders()
+    batches = dispatch_reminders(send_reminders.delay)
+    return {"recorded": recorded, "batches": batches}
+
+
+@shared_task
+def send_reminders(reminder_ids) -> int:
+    return send_reminder_batch(reminder_ids)
+
+
+@shared_task(ignore_result=True)
+def relay_outbox() -> int:
+    """Publish committed outbox events. Scheduled by CELERY_BEAT_SCHEDULE."""
+    return publish_pending_events()
+
+
+def on_borrowing_paid(payload):
+    transaction.on_commit(
+        lambda: notify_about_borrowing_create.delay(
+            payload["borrowing_id"], payload["user_id"]
+        )
+    )
+
+
+EVENT_HANDLERS = {
+    OutboxEvent.BORROWING_PAID: [on_borrowing_paid],
+}
+
+
+# A message that raised is acknowledged all the same, so a failed handler
+# is retried from here. Events that run out of retries are published
+# again by the relay.
+@shared_task(
+    acks_late=True,
+    autoretry_for=(Exception,),
+    retry_backoff=5,
+    retry_backoff_max=5 * 60,
+    max_retries=5,
+)
+def handle_outbox_event(event_id, event_type, payload) -> bool:
+    """Run the handlers of an event, once per event id.
+
+    The event is claimed in the same transaction as the handlers' own
+    writes, so a failed handler leaves it unclaimed for the next attempt.
+    """
+    with transaction.atomic():
+        if not claim_event(event_id):
+            return False
+        for handler in EVENT_HANDLERS.get(event_type, []):
+            handler(payload)
+    return True
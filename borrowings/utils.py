@@ -1,11 +1,37 @@
+import time
 from datetime import date
 
-import stripe
 from decimal import Decimal
-from django.conf import settings
+import stripe
+from django.db import transaction
+from django.db.models import (
+    DateField,
+    DecimalField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import ExtractDay, Round
 from rest_framework import status
 
-from .models import Borrowing
+from library.models import Book
+from library.utils import increment_inventory
+from .gateways import TRANSIENT_ERRORS, get_gateway
+from .models import Borrowing, Payment, Fines, OutboxEvent
+from .outbox import record_event
+
+FINE_MULTIPLIER = Decimal("1.2")
+
+
+def overdue_borrowings(today=None):
+    """Borrowings past their expected return date and not yet returned."""
+    return Borrowing.objects.filter(
+        expected_return_date__lt=today or date.today(), returned__isnull=True
+    )
 
 
 def calculate_amount(borrowing_id):
@@ -20,27 +46,85 @@ def calculate_amount(borrowing_id):
 
 
 def calculate_fines(borrowing_id):
-    fine_multiplier = Decimal(1.2)
     borrowing = Borrowing.objects.get(pk=borrowing_id)
 
     # IF YOU DON'T USE CELERY, PLEASE CHANGE
     # date.today() to borrowing.returned
     duration = date.today() - borrowing.expected_return_date
     if duration.days > 0:
-        amount_dollars = borrowing.book.daily_fee * duration.days * fine_multiplier
+        amount_dollars = borrowing.book.daily_fee * duration.days * FINE_MULTIPLIER
     else:
         amount_dollars = 0
 
     return amount_dollars
 
 
-def stripe_card_payment(borrowing_id, func):
+def apply_overdue_fines(today=None):
+    """Recalculate fines for all overdue borrowings in a single UPDATE.
+
+    Fines are days overdue * book daily fee * FINE_MULTIPLIER, rounded
+    to cents, the same as calculate_fines(). Only rows whose stored
+    value differs are written. A fine_assessed event is recorded for
+    each borrowing fined for the first time. Returns the number of
+    updated rows and the elapsed time in seconds.
+    """
+    today = today or date.today()
+    started = time.monotonic()
+
+    days_overdue = ExtractDay(
+        ExpressionWrapper(
+            Value(today, output_field=DateField()) - F("expected_return_date"),
+            output_field=DurationField(),
+        )
+    )
+    daily_fee = Subquery(
+        Book.objects.filter(pk=OuterRef("book_id")).order_by().values("daily_fee")
+    )
+    fines = Round(
+        ExpressionWrapper(
+            days_overdue * daily_fee * Value(FINE_MULTIPLIER),
+            output_field=DecimalField(max_digits=6, decimal_places=2),
+        ),
+        2,
+    )
+
+    with transaction.atomic():
+        newly_fined = list(
+            overdue_borrowings(today)
+            .filter(fines_applied__isnull=True)
+            .select_for_update()
+            .annotate(new_fines=fines)
+            .values_list("id", "user_id", "new_fines")
+        )
+        updated = (
+            overdue_borrowings(today)
+            .alias(new_fines=fines)
+            .filter(Q(fines_applied__isnull=True) | ~Q(fines_applied=F("new_fines")))
+            .update(fines_applied=fines)
+        )
+        OutboxEvent.objects.bulk_create(
+            OutboxEvent(
+                type=OutboxEvent.FINE_ASSESSED,
+                payload={"borrowing_id": pk, "user_id": user_id, "amount": amount},
+            )
+            for pk, user_id, amount in newly_fined
+        )
+
+    return {"updated": updated, "elapsed": time.monotonic() - started}
+
+
+def stripe_card_payment(amount_dollars, idempotency_key=None):
+    """Charge the card and return the outcome as a response dict.
+
+    Only a definite answer from Stripe, such as a declined card, is
+    returned as an error. Transport errors, for which the card may have
+    been charged, are raised for the caller to retry with the same key.
+    """
     try:
-        amount_dollars = func(borrowing_id)
         amount = int(amount_dollars * 100)
         currency = "usd"
 
-        payment_intent = create_payment_intent(amount, currency)
+        payment_intent = create_payment_intent(amount, currency, idempotency_key)
         stripe_payment_id = payment_intent.id
 
         success, message = handle_payment_response(payment_intent)
@@ -52,22 +136,14 @@ def stripe_card_payment(borrowing_id, func):
             }
         else:
             return {"error": message, "status": status.HTTP_400_BAD_REQUEST}
-    except Exception as e:
+    except TRANSIENT_ERRORS:
+        raise
+    except stripe.error.StripeError as e:
         return {"error": str(e), "status": status.HTTP_400_BAD_REQUEST}
 
 
-def create_payment_intent(amount, currency):
-    stripe.api_key = settings.STRIPE_SECRET_KEY
-
-    payment_intent = stripe.PaymentIntent.create(
-        amount=amount,
-        currency=currency,
-        payment_method_types=["card"],
-        payment_method=settings.STRIPE_PAYMENT_METHOD,
-        confirm=True,
-    )
-
-    return payment_intent
+def create_payment_intent(amount, currency, idempotency_key=None):
+    return get_gateway().create_payment_intent(amount, currency, idempotency_key)
 
 
 def handle_payment_response(payment_intent):
@@ -79,3 +155,75 @@ def handle_payment_response(payment_intent):
             and payment_intent.last_payment_error.message
         )
         return False, f"Payment failed: {error_message}"
+
+
+@transaction.atomic
+def finalize_payment(payment_id, response):
+    """Record the outcome of a borrowing charge.
+
+    On success the borrowing is marked as paid. If the card was declined
+    the copy reserved at checkout goes back to stock. Payments that are no longer
+    pending are left untouched, so a repeated call is harmless.
+    """
+    payment = (
+        Payment.objects.select_for_update()
+        .select_related("borrowing")
+        .get(pk=payment_id)
+    )
+    if payment.status != Payment.PENDING:
+        return payment
+
+    if response.get("status") == 200:
+        payment.status = Payment.SUCCEEDED
+        payment.stripe_payment_id = response["stripe_payment_id"]
+
+        borrowing = payment.borrowing
+        borrowing.paid = True
+        borrowing.payment = payment
+        borrowing.stripe_payment_id = response["stripe_payment_id"]
+        borrowing.save()
+
+        record_event(
+            OutboxEvent.BORROWING_PAID,
+            borrowing_id=borrowing.id,
+            user_id=payment.user_id,
+            payment_id=payment.id,
+            amount=payment.amount_paid,
+        )
+    else:
+        payment.status = Payment.FAILED
+        payment.error = response.get("error", "")[:255]
+        increment_inventory(payment.borrowing.book_id)
+
+    payment.save()
+    return payment
+
+
+@transaction.atomic
+def finalize_fines(fines_id, response):
+    """Record the outcome of a fines charge. See finalize_payment()."""
+    fines = (
+        Fines.objects.select_for_update()
+        .select_related("borrowing", "payment")
+        .get(pk=fines_id)
+    )
+    if fines.status != Payment.PENDING:
+        return fines
+
+    if response.get("status") == 200:
+        fines.status = Payment.SUCCEEDED
+        fines.stripe_payment_id = response["stripe_payment_id"]
+
+        borrowing = fines.borrowing
+        borrowing.fines_paid = True
+        borrowing.stripe_payment_id = response["stripe_payment_id"]
+        borrowing.save()
+
+        fines.payment.fines = fines
+        fines.payment.save()
+    else:
+        fines.status = Payment.FAILED
+        fines.error = response.get("error", "")[:255]
+
+    fines.save()
+    return fines
@@ -1,9 +1,10 @@
 from datetime import date
+from functools import partial
 
 import stripe
-from django.conf import settings
 from django.db import transaction
 from django.shortcuts import redirect, get_object_or_404
+from django.urls import reverse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, status
@@ -11,33 +12,105 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
-from .models import Borrowing, Payment, Fines
+from .models import Borrowing, Payment, Fines, OutboxEvent
 from .serializers import (
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer,
     ReturnActionSerializer,
+    LoanSummarySerializer,
     BorrowingReadonlySerializer,
     PaymentSerializer,
     PaymentListSerializer,
     PaymentDetailSerializer,
     PaymentCreateSerializer,
     RefundActionSerializer,
+    PaymentStatusSerializer,
     FinesSerializer,
     FinesListSerializer,
     FinesDetailSerializer,
     FinesCreateSerializer,
+    FinesStatusSerializer,
+    borrowing_list_values,
+    payment_list_values,
+    fines_list_values,
 )
+from library.exports import EXPORT_FORMATS, streaming_export
 from library.permissions import IsAuthenticatedReadOnly, IsCurrentlyLoggedIn
 
-from library.models import Book
-from .tasks import delay_borrowing_create, notify_about_borrowing_create
-from .utils import stripe_card_payment, calculate_fines, calculate_amount
+from library.utils import decrement_inventory, increment_inventory
+from .gateways import get_gateway, PaymentGatewayError
+from .outbox import record_event
+from .summary import loan_summary
+from .tasks import charge_payment, charge_fines
+from .utils import calculate_fines, calculate_amount
 
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+class ValuesListMixin:
+    """Render the list action from .values() rows with values_serializer."""
+
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.values_serializer.values(
+            self.filter_queryset(self.get_queryset())
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            data = self.values_serializer.to_representation(page)
+            return self.get_paginated_response(data)
+
+        return Response(self.values_serializer.to_representation(queryset))
+
+
+class ExportMixin:
+    """Stream the whole filtered list as CSV or NDJSON.
+
+    Rows are read through a server-side cursor in export_chunk_size
+    batches and rendered by values_serializer one at a time, so memory
+    use does not grow with the size of the export.
+    """
+
+    export_chunk_size = 2000
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "export_format",
+                type=OpenApiTypes.STR,
+                enum=list(EXPORT_FORMATS),
+                description="File format, csv by default (ex. ?export_format=ndjson)",
+            ),
+        ],
+        responses={200: OpenApiTypes.BINARY},
+    )
+    @action(methods=["GET"], detail=False)
+    def export(self, request, *args, **kwargs):
+        """Endpoint for downloading every row of the list"""
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Export format must be one of {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.values_serializer.values(
+            self.filter_queryset(self.get_queryset())
+        )
+        rows = self.values_serializer.iter_representation(
+            queryset.iterator(chunk_size=self.export_chunk_size)
+        )
+
+        return streaming_export(
+            rows, self.values_serializer.field_names, export_format, self.basename
+        )
+
+
+class BorrowingViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Borrowing.objects.select_related("user__profile", "book")
     serializer_class = BorrowingSerializer
+    values_serializer = borrowing_list_values
     permission_classes = [IsAuthenticated]
 
     def get_serializer_class(self):
@@ -49,6 +122,8 @@ class BorrowingViewSet(viewsets.ModelViewSet):
             return BorrowingDetailSerializer
         if self.action == "return_borrowing":
             return ReturnActionSerializer
+        if self.action == "summary":
+            return LoanSummarySerializer
         return BorrowingSerializer
 
     def get_permissions(self):
@@ -97,13 +172,17 @@ class BorrowingViewSet(viewsets.ModelViewSet):
 
             serializer = self.get_serializer(borrowing, data=request.data)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
-
-            book_id = borrowing.book.id
-            book_instance = Book.objects.get(pk=book_id)
-
-            book_instance.inventory += 1
-            book_instance.save()
+            with transaction.atomic():
+                serializer.save()
+                increment_inventory(borrowing.book_id)
+                record_event(
+                    OutboxEvent.BORROWING_RETURNED,
+                    borrowing_id=borrowing.id,
+                    user_id=borrowing.user_id,
+                    book_id=borrowing.book_id,
+                    returned=borrowing.returned,
+                    overdue=borrowing.expected_return_date < borrowing.returned,
+                )
 
             if borrowing.expected_return_date < date.today():
                 # IF YOU DON't USE CELERY, PLEASE UNCOMMENT FOLLOWING TWO LINES
@@ -119,6 +198,25 @@ class BorrowingViewSet(viewsets.ModelViewSet):
 
         return Response({"error": "Fail"}, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "user",
+                type=OpenApiTypes.INT,
+                description="Summary of another user, for admins (ex. ?user=2)",
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False)
+    def summary(self, request):
+        """Last borrowing, overdue borrowings and unpaid fines of the user"""
+        user_id = request.user.id
+        if request.user.is_superuser and request.query_params.get("user"):
+            user_id = int(request.query_params["user"])
+
+        serializer = self.get_serializer(loan_summary(user_id))
+        return Response(serializer.data)
+
     def get_queryset(self):
         user = self.request.query_params.get("user")
         returned = self.request.query_params.get("returned")
@@ -179,9 +277,10 @@ class BorrowingViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.select_related("user__profile", "borrowing")
     serializer_class = PaymentSerializer
+    values_serializer = payment_list_values
     permission_classes = [IsAuthenticated]
 
     def get_serializer_class(self):
@@ -193,6 +292,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return PaymentCreateSerializer
         if self.action == "refund_payment":
             return RefundActionSerializer
+        if self.action == "payment_status":
+            return PaymentStatusSerializer
 
         return PaymentSerializer
 
@@ -206,54 +307,71 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
         return [IsAuthenticated()]
 
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        """Reserve a copy and record a pending payment.
+
+        The card is charged by a worker after this transaction commits;
+        poll the returned status url for the outcome.
+        """
         borrowing_id = request.data.get("borrowing")
 
         if borrowing_id:
-            response = stripe_card_payment(borrowing_id, calculate_amount)
-
-            if response.get("status") == 200:
-                serializer = self.get_serializer(data=request.data)
-                serializer.is_valid(raise_exception=True)
-                self.perform_create(serializer)
-
-                serializer.instance.amount_paid = calculate_amount(borrowing_id)
-                serializer.instance.stripe_payment_id = response["stripe_payment_id"]
-                serializer.instance.save()
-
-                borrowing = Borrowing.objects.get(pk=borrowing_id)
-
-                borrowing.paid = True
-                borrowing.payment = serializer.instance
-                borrowing.stripe_payment_id = response["stripe_payment_id"]
-                borrowing.save()
-
-                book_instance = Book.objects.get(
-                    pk=serializer.instance.borrowing.book.id
-                )
-                book_instance.inventory -= 1
-                book_instance.save()
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            borrowing = serializer.validated_data["borrowing"]
 
-                task_result = notify_about_borrowing_create.apply_async(
-                    args=[borrowing_id, request.user.id], countdown=0
-                )
+            with transaction.atomic():
+                Borrowing.objects.select_for_update().filter(pk=borrowing.pk).first()
+                if Payment.objects.filter(
+                    borrowing=borrowing, status=Payment.PENDING
+                ).exists():
+                    return Response(
+                        {"error": "This borrowing is already being paid"},
+                        status=status.HTTP_409_CONFLICT,
+                    )
 
-                if not task_result:
+                if not decrement_inventory(borrowing.book_id):
                     return Response(
-                        {"error": "Failed to schedule task"},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        {"error": "This book is not currently available"},
+                        status=status.HTTP_406_NOT_ACCEPTABLE,
                     )
 
-            return Response(response)
+                self.perform_create(serializer)
+                payment = serializer.instance
+                transaction.on_commit(partial(charge_payment.delay, payment.id))
+
+            status_url = reverse(
+                "borrowings:payments-payment-status", args=[payment.id]
+            )
+            return Response(
+                PaymentStatusSerializer(payment).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
+            )
 
         return Response(
             {"error": "No borrowing found"}, status=status.HTTP_404_NOT_FOUND
         )
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        borrowing = serializer.validated_data["borrowing"]
+        serializer.save(
+            user=self.request.user,
+            amount_paid=calculate_amount(borrowing.id),
+            status=Payment.PENDING,
+        )
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="status",
+    )
+    def payment_status(self, request, pk):
+        """Endpoint for polling the outcome of a payment"""
+        payment = self.get_object()
+        serializer = self.get_serializer(payment)
+
+        return Response(serializer.data)
 
     def perform_update(self, serializer):
         serializer.save(user=self.request.user)
@@ -265,7 +383,6 @@ class PaymentViewSet(viewsets.ModelViewSet):
     )
     def refund_payment(self, request, pk):
         """Endpoint for refunding costs for a borrowing"""
-        stripe.api_key = settings.STRIPE_SECRET_KEY
         if request.method == "POST":
             payment = get_object_or_404(Payment, pk=pk)
             borrowing = get_object_or_404(Borrowing, pk=payment.borrowing.id)
@@ -279,18 +396,26 @@ class PaymentViewSet(viewsets.ModelViewSet):
 
             try:
                 if payment_intent_id:
-                    refund = stripe.Refund.create(payment_intent=payment_intent_id)
+                    refund = get_gateway().refund(payment_intent_id)
                     if refund:
                         payment.refunded = True
                         borrowing.cancelled = True
-                        borrowing.save()
-                        payment.save()
+                        with transaction.atomic():
+                            borrowing.save()
+                            payment.save()
+                            record_event(
+                                OutboxEvent.REFUND_ISSUED,
+                                borrowing_id=borrowing.id,
+                                user_id=payment.user_id,
+                                payment_id=payment.id,
+                                amount=payment.amount_paid,
+                            )
 
                         return Response(
                             {"message": "Refund created"}, status=status.HTTP_200_OK
                         )
 
-            except stripe.error.StripeError as e:
+            except (stripe.error.StripeError, PaymentGatewayError) as e:
                 print("Stripe error:", str(e))
                 return Response(
                     {"error": "Failed to create refund: " + str(e)},
@@ -327,9 +452,10 @@ class PaymentViewSet(viewsets.ModelViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class FinesViewSet(viewsets.ModelViewSet):
+class FinesViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Fines.objects.select_related("user__profile", "borrowing")
     serializer_class = FinesSerializer
+    values_serializer = fines_list_values
     permission_classes = [IsAuthenticated]
 
     def get_serializer_class(self):
@@ -339,6 +465,8 @@ class FinesViewSet(viewsets.ModelViewSet):
             return FinesDetailSerializer
         if self.action in ["create", "update", "partial_update"]:
             return FinesCreateSerializer
+        if self.action == "fines_status":
+            return FinesStatusSerializer
 
         return FinesSerializer
 
@@ -350,50 +478,65 @@ class FinesViewSet(viewsets.ModelViewSet):
 
         return [IsAuthenticated()]
 
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        """Record pending fines; the card is charged by a worker."""
         borrowing_id = request.data.get("borrowing")
-        borrowing = Borrowing.objects.get(pk=borrowing_id)
 
         if borrowing_id:
-            response = stripe_card_payment(borrowing_id, calculate_fines)
-
-            if response.get("status") == 200:
-                serializer = self.get_serializer(data=request.data)
-                serializer.is_valid(raise_exception=True)
-                self.perform_create(serializer)
-
-                payment = borrowing.payment
-
-                serializer.instance.fines_paid = calculate_fines(borrowing_id)
-                serializer.instance.stripe_payment_id = response["stripe_payment_id"]
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            borrowing = serializer.validated_data["borrowing"]
 
-                if payment:
-                    serializer.instance.payment = payment
-                    serializer.instance.save()
-                    print("serpay", serializer.instance.payment)
+            if not borrowing.payment_id:
+                return Response(
+                    {"error": "No payment found"}, status=status.HTTP_404_NOT_FOUND
+                )
 
-                    payment.fines = serializer.instance
-                else:
+            with transaction.atomic():
+                Borrowing.objects.select_for_update().filter(pk=borrowing.pk).first()
+                if Fines.objects.filter(
+                    borrowing=borrowing, status=Payment.PENDING
+                ).exists():
                     return Response(
-                        {"error": "No payment found"}, status=status.HTTP_404_NOT_FOUND
+                        {"error": "These fines are already being paid"},
+                        status=status.HTTP_409_CONFLICT,
                     )
 
-                borrowing.fines_paid = True
-                borrowing.stripe_payment_id = response["stripe_payment_id"]
-
-                borrowing.save()
-                payment.save()
+                self.perform_create(serializer)
+                fines = serializer.instance
+                transaction.on_commit(partial(charge_fines.delay, fines.id))
 
-            return Response(response)
+            status_url = reverse("borrowings:fines-fines-status", args=[fines.id])
+            return Response(
+                FinesStatusSerializer(fines).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
+            )
 
         return Response(
             {"error": "No borrowing found"}, status=status.HTTP_404_NOT_FOUND
         )
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        borrowing = serializer.validated_data["borrowing"]
+        serializer.save(
+            user=self.request.user,
+            payment_id=borrowing.payment_id,
+            fines_paid=calculate_fines(borrowing.id),
+            status=Payment.PENDING,
+        )
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="status",
+    )
+    def fines_status(self, request, pk):
+        """Endpoint for polling the outcome of a fines payment"""
+        fines = self.get_object()
+        serializer = self.get_serializer(fines)
+
+        return Response(serializer.data)
 
     def perform_update(self, serializer):
         serializer.save(user=self.request.user)
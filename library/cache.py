@@ -0,0 +1,69 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "library:catalog:version"
+HITS_KEY = "library:catalog:hits"
+MISSES_KEY = "library:catalog:misses"
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost key never brings back old entries.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response."""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_cache_stats():
+    return {
+        "hits": cache.get(HITS_KEY, 0),
+        "misses": cache.get(MISSES_KEY, 0),
+    }
+
+
+def response_cache_key(request):
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    return f"library:catalog:{get_catalog_version()}:{digest}"
+
+
+def cached_response(view, request, *args, **kwargs):
+    """Serve a successful catalog response from the cache when possible.
+
+    Entries are keyed on the full url (path, query params and host, which
+    appears in pagination links) and the catalog version, so bumping the
+    version drops them all at once.
+    """
+    key = response_cache_key(request)
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return Response(data, headers={"X-Cache": "HIT"})
+
+    _count(MISSES_KEY)
+    response = view(request, *args, **kwargs)
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
@@ -0,0 +1,49 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    """File-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fieldnames):
+    writer = csv.DictWriter(Echo(), fieldnames=fieldnames)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    encoder = JSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def streaming_export(rows, fieldnames, export_format, filename):
+    """Stream rows as a CSV or NDJSON attachment.
+
+    rows may be any iterable; it is only consumed as the response is sent.
+    """
+    if export_format == "csv":
+        content = csv_lines(rows, fieldnames)
+    else:
+        content = ndjson_lines(rows)
+
+    return StreamingHttpResponse(
+        content,
+        content_type=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{export_format}"'
+        },
+    )
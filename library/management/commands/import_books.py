@@ -0,0 +1,128 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from library.cache import bump_catalog_version
+from library.serializers import BookImportSerializer
+from library.utils import upsert_books
+
+FORMATS = ("csv", "jsonl")
+
+
+def read_csv(file):
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(file):
+    for line_num, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            row = {"__error__": str(error), "__raw__": line.rstrip("\r\n")}
+        yield line_num, row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert books from a CSV or JSON Lines file, matching on "
+        "(author, title). The file is streamed in batches, so its size "
+        "does not matter. Rejected rows are written to an error report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--progress-every", type=int, default=100000)
+        parser.add_argument(
+            "--errors",
+            help="Error report path. Defaults to <path>.errors.jsonl.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or self.guess_format(path)
+        reader = read_jsonl if file_format == "jsonl" else read_csv
+        self.error_path = options["errors"] or f"{path}.errors.jsonl"
+        self.error_file = None
+        self.serializer = BookImportSerializer()
+
+        started = time.monotonic()
+        read = upserted = rejected = 0
+        next_report = options["progress_every"]
+
+        try:
+            with open(path, newline="", encoding="utf-8-sig") as file:
+                for batch in batched(reader(file), options["batch_size"]):
+                    valid = []
+                    for line_num, row in batch:
+                        data = self.validate(line_num, row)
+                        if data is None:
+                            rejected += 1
+                        else:
+                            valid.append(data)
+
+                    if valid:
+                        upserted += upsert_books(valid)
+                    read += len(batch)
+
+                    if read >= next_report:
+                        self.report(read, upserted, rejected, started)
+                        next_report += options["progress_every"]
+        except FileNotFoundError:
+            raise CommandError(f"File {path} does not exist")
+        finally:
+            if self.error_file:
+                self.error_file.close()
+
+        if upserted:
+            bump_catalog_version()
+
+        self.report(read, upserted, rejected, started)
+        if rejected:
+            self.stderr.write(f"{rejected} rows rejected, see {self.error_path}")
+
+    @staticmethod
+    def guess_format(path):
+        if path.endswith((".jsonl", ".ndjson")):
+            return "jsonl"
+        return "csv"
+
+    def validate(self, line_num, row):
+        if not isinstance(row, dict):
+            return self.reject(line_num, row, {"non_field_errors": ["Not an object"]})
+        if "__error__" in row:
+            return self.reject(line_num, row["__raw__"], row["__error__"])
+
+        try:
+            return self.serializer.run_validation(row)
+        except ValidationError as error:
+            return self.reject(line_num, row, error.detail)
+
+    def reject(self, line_num, row, errors):
+        if self.error_file is None:
+            self.error_file = open(self.error_path, "w", encoding="utf-8")
+        self.error_file.write(
+            json.dumps({"line": line_num, "errors": errors, "row": row}) + "\n"
+        )
+
+    def report(self, read, upserted, rejected, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{read} rows read, {upserted} upserted, {rejected} rejected "
+            f"in {elapsed:.1f}s ({read / (elapsed or 1):.0f} rows/s)"
+        )
@@ -0,0 +1,156 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from library_api_service.celery import app as celery_app
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+TASK_DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent processing a request.",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests being processed.",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+HTTP_THROTTLED_REQUESTS = Counter(
+    "http_throttled_requests",
+    "Requests rejected by a throttle.",
+    ["method", "route"],
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Database queries run while processing a request.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_QUERY_DURATION_PER_REQUEST = Histogram(
+    "db_query_duration_per_request_seconds",
+    "Time spent in database queries while processing a request.",
+    ["route"],
+)
+EXTERNAL_CALL_DURATION = Histogram(
+    "external_call_duration_seconds",
+    "Time spent calling an external service.",
+    ["service", "operation", "outcome"],
+)
+
+CELERY_TASK_RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Time a worker spent running a task.",
+    ["task", "state"],
+    buckets=TASK_DURATION_BUCKETS,
+)
+CELERY_TASK_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time from publishing a task, or its ETA, to a worker starting it.",
+    ["task", "queue"],
+    buckets=TASK_DURATION_BUCKETS,
+)
+CELERY_TASK_FAILURES = Counter(
+    "celery_task_failures",
+    "Tasks that raised an exception.",
+    ["task", "exception"],
+)
+CELERY_TASK_RETRIES = Counter(
+    "celery_task_retries",
+    "Task retries.",
+    ["task"],
+)
+
+
+class CeleryQueueDepthCollector:
+    """Report the number of messages waiting in each Celery queue.
+
+    The broker is asked on every scrape, so the value is never stale and
+    no worker has to be alive for a growing backlog to show up.
+    """
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "celery_queue_depth",
+            "Messages waiting in a Celery queue.",
+            labels=["queue"],
+        )
+        try:
+            with celery_app.connection_for_read() as connection:
+                connection.ensure_connection(max_retries=1)
+                for queue in celery_app.amqp.queues:
+                    depth.add_metric([queue], self.message_count(connection, queue))
+        except Exception:
+            # A broker outage must not break the rest of the scrape.
+            return
+        yield depth
+
+    @staticmethod
+    def message_count(connection, queue):
+        with connection.channel() as channel:
+            try:
+                return channel.queue_declare(queue=queue, passive=True).message_count
+            except connection.channel_errors:
+                # Not declared by any worker yet, so nothing can be waiting.
+                return 0
+
+
+REGISTRY.register(CeleryQueueDepthCollector())
+
+
+@contextmanager
+def observe_external_call(service, operation):
+    """Time a call to a third-party API such as Stripe or Telegram."""
+    outcome = "error"
+    started = time.perf_counter()
+    try:
+        yield
+        outcome = "success"
+    finally:
+        EXTERNAL_CALL_DURATION.labels(service, operation, outcome).observe(
+            time.perf_counter() - started
+        )
+
+
+def get_registry():
+    """Return the registry to export.
+
+    When PROMETHEUS_MULTIPROC_DIR is set, every server process writes its
+    samples there and they are aggregated on each scrape.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(CeleryQueueDepthCollector())
+    return registry
+
+
+def metrics_view(request):
+    """Serve the metrics to scrapers holding settings.METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    received = request.headers.get("Authorization", "")
+    if not token or not hmac.compare_digest(received, f"Bearer {token}"):
+        raise Http404
+
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,66 @@
+import time
+
+from django.db import connection
+from rest_framework import status
+
+from .metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_QUERY_DURATION_PER_REQUEST,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_THROTTLED_REQUESTS,
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class QueryStats:
+    """Execute wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class PrometheusMiddleware:
+    """Record latency, in-flight requests and DB usage for every request.
+
+    Requests are labelled by URL name rather than path, so the number of
+    time series does not grow with the number of objects.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(request.method)
+        queries = QueryStats()
+        started = time.perf_counter()
+
+        in_progress.inc()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            in_progress.dec()
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = match.view_name if match else UNMATCHED_ROUTE
+        HTTP_REQUEST_DURATION.labels(
+            request.method, route, response.status_code
+        ).observe(duration)
+        DB_QUERIES_PER_REQUEST.labels(route).observe(queries.count)
+        DB_QUERY_DURATION_PER_REQUEST.labels(route).observe(queries.duration)
+        if response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            HTTP_THROTTLED_REQUESTS.labels(request.method, route).inc()
+
+        return response
@@ -1,4 +1,11 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
+
+
+def book_display(title, author):
+    return f"{title} (by {author})"
 
 
 class Book(models.Model):
@@ -12,10 +19,29 @@ class Book(models.Model):
         ("S", "Soft"),
     ]
     cover = models.CharField(max_length=1, choices=COVER_CHOICES, blank=True)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("title", weight="A", config="english")
+            + SearchVector("author", weight="B", config="english")
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     def __str__(self):
-        return f"{self.title} (by {self.author})"
+        return book_display(self.title, self.author)
 
     class Meta:
         ordering = ["author", "title"]
         unique_together = ["author", "title"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="book_search_vector_idx"),
+            GinIndex(OpClass("title", name="gin_trgm_ops"), name="book_title_trgm_idx"),
+            GinIndex(
+                OpClass("author", name="gin_trgm_ops"), name="book_author_trgm_idx"
+            ),
+            GinIndex(
+                OpClass(Upper("title"), name="gin_trgm_ops"),
+                name="book_title_upper_trgm_idx",
+            ),
+        ]
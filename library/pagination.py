@@ -0,0 +1,127 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class ModelOrderingCursorPagination(CursorPagination):
+    """Keyset pagination ordered by the paginated model's Meta.ordering.
+
+    Pages are fetched with a WHERE on the ordering fields instead of
+    OFFSET, and no COUNT(*) query is issued, so every page costs the same.
+    Models without Meta.ordering are paginated by primary key. Views can
+    override the ordering for a request by setting cursor_ordering.
+
+    The primary key is always part of the ordering and the cursor holds
+    the whole row key, so ties on the leading fields are paged with a
+    tuple comparison rather than DRF's capped offset.
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = settings.MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        opts = queryset.model._meta
+        ordering = (
+            getattr(view, "cursor_ordering", None)
+            or tuple(opts.ordering)
+            or (opts.pk.name,)
+        )
+        self.ordering = unique_ordering(ordering, opts.pk.name)
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            try:
+                values = json.loads(current_position)
+                condition = keyset_after(ordering, values)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(condition)
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(instance[field_name])
+            else:
+                values.append(getattr(instance, field_name))
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+
+def unique_ordering(ordering, pk_name):
+    """Return ordering cut at, or extended with, the primary key."""
+    ordering = tuple(ordering)
+    for index, order in enumerate(ordering):
+        if order.lstrip("-") in (pk_name, "pk"):
+            return ordering[: index + 1]
+    return ordering + (pk_name,)
+
+
+def keyset_after(ordering, values):
+    """Build the condition for rows strictly after values in ordering.
+
+    This is the tuple comparison (a, b, c) > (x, y, z) expanded field by
+    field, so that each field can sort in its own direction.
+    """
+    if len(values) != len(ordering):
+        raise ValueError("Cursor does not match the ordering.")
+
+    condition = Q()
+    equal = Q()
+    for order, value in zip(ordering, values):
+        field_name = order.lstrip("-")
+        lookup = "lt" if order.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{field_name}__{lookup}": value})
+        equal &= Q(**{field_name: value})
+
+    # The leading bound on its own lets the planner range-scan an index.
+    first = ordering[0]
+    lookup = "lte" if first.startswith("-") else "gte"
+    return Q(**{f"{first.lstrip('-')}__{lookup}": values[0]}) & condition
@@ -0,0 +1,35 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest
+
+
+def search_books(queryset, text):
+    """Rank books matching text by title and author.
+
+    Full-text matches on the indexed search_vector come first. When there
+    are none, fall back to trigram word similarity so that typos still
+    find something. The rank is cast to double precision, which keeps it
+    exact when used as a pagination cursor.
+    """
+    query = SearchQuery(text, config="english", search_type="websearch")
+    matches = queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
+    if matches.exists():
+        return matches
+
+    return queryset.filter(
+        Q(title__trigram_word_similar=text) | Q(author__trigram_word_similar=text)
+    ).annotate(
+        rank=Cast(
+            Greatest(
+                TrigramWordSimilarity(text, "title"),
+                TrigramWordSimilarity(text, "author"),
+            ),
+            FloatField(),
+        )
+    )
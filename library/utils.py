@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump_catalog_version
+from .models import Book
+
+
+def decrement_inventory(book_id):
+    """Take one copy of a book out of stock in a single UPDATE.
+
+    Returns False without changing anything if no copies are left.
+    """
+    updated = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1
+    )
+    if updated:
+        transaction.on_commit(bump_catalog_version)
+    return bool(updated)
+
+
+def increment_inventory(book_id):
+    """Put one copy of a book back in stock in a single UPDATE."""
+    Book.objects.filter(pk=book_id).update(inventory=F("inventory") + 1)
+    transaction.on_commit(bump_catalog_version)
+
+
+def upsert_books(rows):
+    """Insert or update books in one statement, matching on (author, title).
+
+    Later rows win when a batch names the same book twice.
+    """
+    books = {(row["author"], row["title"]): Book(**row) for row in rows}
+    Book.objects.bulk_create(
+        books.values(),
+        update_conflicts=True,
+        unique_fields=["author", "title"],
+        update_fields=["inventory", "daily_fee", "cover"],
+    )
+    return len(books)
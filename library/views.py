@@ -3,10 +3,12 @@ from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
+from .cache import cached_response
 from .models import (
     Book,
 )
 
+from .search import search_books
 from .serializers import (
     BookSerializer,
     BookListSerializer,
@@ -40,11 +42,16 @@ class BookViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         title = self.request.query_params.get("title")
+        search = self.request.query_params.get("search")
         queryset = self.queryset.all()
 
         if title:
             queryset = queryset.filter(title__icontains=title)
 
+        if search:
+            queryset = search_books(queryset, search)
+            self.cursor_ordering = ("-rank", "id")
+
         return queryset
 
     @extend_schema(
@@ -53,8 +60,17 @@ class BookViewSet(viewsets.ModelViewSet):
                 "title",
                 type=OpenApiTypes.STR,
                 description="Filter books by title (ex. ?title=book1)",
-            )
+            ),
+            OpenApiParameter(
+                "search",
+                type=OpenApiTypes.STR,
+                description="Search books by title and author, most relevant "
+                "first (ex. ?search=tolkien hobbit)",
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        return cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(super().retrieve, request, *args, **kwargs)
@@ -16,6 +16,9 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# Imported after the app exists: the metrics module it uses imports the app.
+from . import celery_signals  # noqa: E402, F401
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
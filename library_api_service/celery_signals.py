@@ -0,0 +1,80 @@
+"""Record task metrics from Celery's signals, in workers and publishers."""
+
+import os
+import time
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_ready,
+)
+from django.utils.dateparse import parse_datetime
+from prometheus_client import start_http_server
+
+from library.metrics import (
+    CELERY_TASK_FAILURES,
+    CELERY_TASK_QUEUE_WAIT,
+    CELERY_TASK_RETRIES,
+    CELERY_TASK_RUNTIME,
+    get_registry,
+)
+
+_task_started = {}
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    now = time.time()
+    _task_started[task_id] = time.perf_counter()
+
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is None:
+        return
+    eta = task.request.eta
+    if isinstance(eta, str):
+        eta = parse_datetime(eta)
+    if eta:
+        published_at = max(published_at, eta.timestamp())
+
+    queue = (task.request.delivery_info or {}).get("routing_key") or "unknown"
+    CELERY_TASK_QUEUE_WAIT.labels(task.name, queue).observe(max(now - published_at, 0))
+
+
+@task_postrun.connect
+def record_task_runtime(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_RUNTIME.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+
+
+@task_failure.connect
+def count_task_failure(sender=None, exception=None, **kwargs):
+    CELERY_TASK_FAILURES.labels(sender.name, type(exception).__name__).inc()
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    CELERY_TASK_RETRIES.labels(sender.name).inc()
+
+
+@worker_ready.connect
+def serve_worker_metrics(**kwargs):
+    """Expose worker metrics when CELERY_METRICS_PORT is set.
+
+    Not needed when the worker shares PROMETHEUS_MULTIPROC_DIR with the
+    web server, whose /metrics/ then includes the worker samples.
+    """
+    port = os.environ.get("CELERY_METRICS_PORT")
+    if port:
+        start_http_server(int(port), registry=get_registry())
@@ -11,9 +11,12 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
+from celery.schedules import crontab
+from kombu import Queue
 
 
 load_dotenv()
@@ -49,6 +52,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "rest_framework_simplejwt.token_blacklist",
@@ -61,6 +65,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library.middleware.PrometheusMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -113,6 +118,26 @@ DATABASES = {
 }
 
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_CACHE_URL", "redis://redis:6379/1"),
+    }
+}
+
+if "test" in sys.argv[1:2]:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = 60 * 15
+# How long an authenticated user's id, flags and name are served from the
+# cache. The entry is also dropped when the user or profile is saved.
+PRINCIPAL_CACHE_TIMEOUT = 60 * 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -167,14 +192,17 @@ REST_FRAMEWORK = {
         "rest_framework.throttling.UserRateThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {"anon": "30/day", "user": "300/day"},
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
-    # "DEFAULT_PAGINATION_CLASS":
-    #     "rest_framework.pagination.LimitOffsetPagination",
-    # "PAGE_SIZE": 10,
+    "DEFAULT_AUTHENTICATION_CLASSES": ("user.authentication.CachedJWTAuthentication",),
+    "DEFAULT_PAGINATION_CLASS": "library.pagination.ModelOrderingCursorPagination",
+    "PAGE_SIZE": 10,
 }
 
+MAX_PAGE_SIZE = 100
+
+# Prometheus must send this as a bearer token to scrape /metrics/. The
+# endpoint answers 404 while it is unset.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Library API Service",
     "DESCRIPTION": "Manage library",
@@ -192,14 +220,51 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60 * 24 * 7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=14),
     "ROTATE_REFRESH_TOKENS": True,
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.FilteredTokenRefreshSerializer",
 }
 
+# Bloom filter in front of the refresh token blacklist, so refreshing a
+# token that is not blacklisted skips the database (see user/blacklist.py).
+# It is rebuilt by the nightly compaction and used once first built.
+TOKEN_BLACKLIST_FILTER = {
+    "backend": "user.blacklist.RedisBloomFilter",
+    "url": os.environ.get("REDIS_CACHE_URL", "redis://redis:6379/1"),
+    "capacity": 1_000_000,
+    "error_rate": 0.01,
+}
+
+if "test" in sys.argv[1:2]:
+    TOKEN_BLACKLIST_FILTER = {"backend": "user.blacklist.MemoryBloomFilter"}
+
 TELEGRAM = {
     "bot_token": os.environ["TELEGRAM_BOT_TOKEN"],
+    # Sent by Telegram with every webhook update. Polling works without it.
+    "webhook_secret": os.environ.get("TELEGRAM_WEBHOOK_SECRET"),
+    # Redis URL for the bot's conversations, so that several bot processes
+    # can share them. They are kept in process memory if unset.
+    "state_url": os.environ.get("TELEGRAM_STATE_URL"),
+    "transport": os.environ.get(
+        "TELEGRAM_TRANSPORT", "borrowings.notifications.TelegramTransport"
+    ),
+    "connect_timeout": 3,
+    "read_timeout": 10,
+    "max_connections": 8,
+    "max_retries": 3,
+    # Telegram allows about 30 messages a second, and one a second per chat.
+    # Each worker process paces itself, so workers that send at the same time
+    # split the global rate between them with TELEGRAM_GLOBAL_RATE.
+    "global_rate": float(os.environ.get("TELEGRAM_GLOBAL_RATE", 30)),
+    "chat_rate": 1,
 }
 
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# Set to django.core.mail.backends.filebased.EmailBackend or
+# user.mail.FakeSMTPBackend to try out email delivery offline.
+EMAIL_BACKEND = os.environ.get(
+    "EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend"
+)
+EMAIL_FILE_PATH = os.environ.get("EMAIL_FILE_PATH", BASE_DIR / "sent_emails")
+EMAIL_TIMEOUT = 10
 
 EMAIL_HOST = os.environ["EMAIL_HOST"]
 EMAIL_PORT = os.environ["EMAIL_PORT"]
@@ -207,14 +272,83 @@ EMAIL_USE_TLS = os.environ["EMAIL_USE_TLS"]
 EMAIL_HOST_USER = os.environ["EMAIL_HOST_USER"]
 EMAIL_HOST_PASSWORD = os.environ["EMAIL_HOST_PASSWORD"]
 
+# Each email worker process keeps up to max_connections SMTP connections
+# open between messages (see user/mail.py).
+EMAIL_DELIVERY = {
+    "max_connections": 2,
+    "idle_timeout": 30,
+}
+
 
 STRIPE_SECRET_KEY = os.environ["STRIPE_SECRET_KEY"]
 STRIPE_PUBLISHABLE_KEY = os.environ["STRIPE_PUBLISHABLE_KEY"]
 STRIPE_PAYMENT_METHOD = os.environ["STRIPE_PAYMENT_METHOD"]
 
+PAYMENT_GATEWAY = {
+    "backend": os.environ.get(
+        "PAYMENT_GATEWAY_BACKEND", "borrowings.gateways.StripeGateway"
+    ),
+    "connect_timeout": 3,
+    "read_timeout": 10,
+    "max_connections": 10,
+    "max_network_retries": 1,
+    "failure_threshold": 5,
+    "reset_timeout": 30,
+    "latency": float(os.environ.get("PAYMENT_GATEWAY_FAKE_LATENCY", 0)),
+    "failure_rate": float(os.environ.get("PAYMENT_GATEWAY_FAKE_FAILURE_RATE", 0)),
+}
+
+# Charges still pending after this many seconds are enqueued again, in case
+# the message published after checkout was lost.
+PENDING_CHARGE_TIMEOUT = 15 * 60
+
 
 CELERY_BROKER_URL = os.environ["CELERY_BROKER_URL"]
 CELERY_RESULT_BACKEND = os.environ["CELERY_RESULT_BACKEND"]
 CELERY_TIMEZONE = "Europe/Kiev"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# I/O-bound notifications, DB-bound fines and payment charges each get a
+# queue of their own, consumed by separately configured workers (see
+# docker-compose.yml), so a slow Telegram send never delays the nightly
+# fines run and the other way round.
+CELERY_TASK_DEFAULT_QUEUE = "celery"
+CELERY_TASK_QUEUES = (
+    Queue("celery"),
+    Queue("notifications"),
+    Queue("fines"),
+    Queue("payments"),
+    Queue("reminders"),
+    Queue("telegram"),
+    Queue("email"),
+)
+CELERY_TASK_ROUTES = {
+    "borrowings.tasks.notify_about_borrowing_create": {"queue": "notifications"},
+    "borrowings.tasks.calculate_fines_daily": {"queue": "fines"},
+    "borrowings.tasks.schedule_reminders": {"queue": "fines"},
+    "borrowings.tasks.send_reminders": {"queue": "reminders"},
+    "user.tasks.handle_telegram_update": {"queue": "telegram"},
+    "user.tasks.send_email": {"queue": "email"},
+    "borrowings.tasks.charge_*": {"queue": "payments"},
+    "borrowings.tasks.retry_pending_charges": {"queue": "payments"},
+}
+CELERY_BEAT_SCHEDULE = {
+    "relay-outbox": {
+        "task": "borrowings.tasks.relay_outbox",
+        "schedule": 2.0,
+        # A relay that waited longer than this is superseded by a newer one.
+        "options": {"expires": 10},
+    },
+    "retry-pending-charges": {
+        "task": "borrowings.tasks.retry_pending_charges",
+        "schedule": 5 * 60.0,
+    },
+    "schedule-reminders": {
+        "task": "borrowings.tasks.schedule_reminders",
+        "schedule": crontab(hour=18, minute=0),
+    },
+    "compact-token-blacklist": {
+        "task": "user.tasks.compact_token_blacklist",
+        "schedule": crontab(hour=3, minute=30),
+    },
+}
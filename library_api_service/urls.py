@@ -25,6 +25,8 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from library.metrics import metrics_view
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -42,5 +44,6 @@ urlpatterns = [
         SpectacularRedocView.as_view(url_name="schema"),
         name="redoc",
     ),
+    path("metrics/", metrics_view, name="metrics"),
     path("__debug__/", include("debug_toolbar.urls")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
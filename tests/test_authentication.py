@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from tests.test_borrowings_api import sample_borrowing
+from user.authentication import load_principal, principal_key
+from user.models import Profile
+
+SUMMARY_URL = reverse("borrowings:borrowings-summary")
+LOGOUT_URL = reverse("user:logout")
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        self.profile = Profile.objects.create(
+            user=self.user, first_name="Jane", last_name="Doe"
+        )
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.refresh.access_token}"
+        )
+
+    def test_no_auth_queries_once_cached(self):
+        sample_borrowing(1, user=self.user)
+        self.client.get(SUMMARY_URL)
+
+        # Only the summary query itself.
+        with self.assertNumQueries(1):
+            res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(res.data["last_borrowing"])
+
+    def test_principal_fields(self):
+        principal = load_principal(self.user.id)
+
+        self.assertEqual(principal["email"], "test@test.com")
+        self.assertEqual(principal["profile__first_name"], "Jane")
+        self.assertFalse(principal["is_superuser"])
+
+    def test_profile_save_invalidates_principal(self):
+        load_principal(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.first_name = "Janet"
+            self.profile.save()
+
+        self.assertIsNone(cache.get(principal_key(self.user.id)))
+        self.assertEqual(load_principal(self.user.id)["profile__first_name"], "Janet")
+
+    def test_deactivated_user_rejected(self):
+        self.client.get(SUMMARY_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.client.get(SUMMARY_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_rejected(self):
+        self.client.get(SUMMARY_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        res = self.client.get(SUMMARY_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_invalidates_principal(self):
+        self.client.get(SUMMARY_URL)
+
+        res = self.client.post(
+            LOGOUT_URL, {"refresh_token": str(self.refresh)}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_205_RESET_CONTENT)
+        self.assertIsNone(cache.get(principal_key(self.user.id)))
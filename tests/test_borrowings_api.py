@@ -1,23 +1,39 @@
 from datetime import date, timedelta, datetime
+import json
+from decimal import Decimal
+from unittest import mock
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from borrowings.models import Borrowing
+from borrowings.gateways import PaymentGatewayError
+from borrowings.models import Borrowing, Payment, Fines, OutboxEvent
 from borrowings.serializers import (
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer,
+    BorrowingSummarySerializer,
+    PaymentListSerializer,
+    FinesListSerializer,
+    borrowing_list_values,
+    payment_list_values,
+    fines_list_values,
 )
+from borrowings.tasks import charge_payment, retry_pending_charges
+from borrowings.utils import apply_overdue_fines, calculate_fines
 from tests import test_library_api, test_user_api
 
 from user.models import Profile
 
 
 BORROWING_URL = reverse("borrowings:borrowings-list")
+PAYMENT_URL = reverse("borrowings:payments-list")
+SUMMARY_URL = reverse("borrowings:borrowings-summary")
 
 
 def detail_url(borrowing_id):
@@ -86,7 +102,7 @@ class AuthenticatedBorrowingApiTests(TestCase):
         sample_borrowing(2, user=self.user)
 
         res = self.client.get(BORROWING_URL)
-        self.assertEqual(res.data, [])
+        self.assertEqual(res.data["results"], [])
 
     def test_list_returned_borrowings_forbidden(self):
         """Users are not allowed to see borrowings, they returned"""
@@ -94,7 +110,7 @@ class AuthenticatedBorrowingApiTests(TestCase):
         sample_borrowing(2, user=self.user, returned=date.today())
 
         res = self.client.get(BORROWING_URL)
-        self.assertEqual(res.data, [])
+        self.assertEqual(res.data["results"], [])
 
     def test_list_cancelled_borrowings_forbidden(self):
         """Users are not allowed to see borrowings, they cancelled"""
@@ -102,7 +118,7 @@ class AuthenticatedBorrowingApiTests(TestCase):
         sample_borrowing(2, user=self.user, cancelled=True)
 
         res = self.client.get(BORROWING_URL)
-        self.assertEqual(res.data, [])
+        self.assertEqual(res.data["results"], [])
 
     def test_see_others_borrowings_forbidden(self):
         """Users are not allowed to see borrowings of other users"""
@@ -116,9 +132,9 @@ class AuthenticatedBorrowingApiTests(TestCase):
         serializer2 = BorrowingListSerializer(borrowing2)
         serializer3 = BorrowingListSerializer(borrowing3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data["results"])
+        self.assertNotIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
 
     def test_borrow_date_vaildation(self):
         """Borrow date should not be earlier than today"""
@@ -163,7 +179,7 @@ class AuthenticatedBorrowingApiTests(TestCase):
         serializer = BorrowingListSerializer(borrowings, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_retrieve_borrowing_detail(self):
         borrowing = sample_borrowing(1, user=self.user, paid=True)
@@ -174,6 +190,67 @@ class AuthenticatedBorrowingApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_loan_summary(self):
+        today = date.today()
+        sample_borrowing(
+            1,
+            user=self.user,
+            borrow_date=today - timedelta(days=20),
+            expected_return_date=today - timedelta(days=10),
+            returned=today - timedelta(days=5),
+            fines_applied=Decimal("3.00"),
+        )
+        overdue = sample_borrowing(
+            2,
+            user=self.user,
+            borrow_date=today - timedelta(days=20),
+            expected_return_date=today - timedelta(days=2),
+            fines_applied=Decimal("2.00"),
+        )
+        sample_borrowing(
+            3,
+            user=self.user,
+            borrow_date=today - timedelta(days=20),
+            expected_return_date=today - timedelta(days=10),
+            returned=today - timedelta(days=5),
+            fines_applied=Decimal("9.00"),
+            fines_paid=True,
+        )
+        last = sample_borrowing(
+            4,
+            user=self.user,
+            borrow_date=today,
+            expected_return_date=today + timedelta(days=7),
+        )
+        sample_borrowing(
+            5,
+            user=sample_user(5),
+            borrow_date=today - timedelta(days=20),
+            expected_return_date=today - timedelta(days=2),
+        )
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["last_borrowing"], BorrowingSummarySerializer(last).data
+        )
+        self.assertEqual(
+            res.data["overdue"], [BorrowingSummarySerializer(overdue).data]
+        )
+        self.assertEqual(res.data["outstanding_fines"], "5.00")
+
+    def test_loan_summary_of_other_user_ignored(self):
+        sample_borrowing(1, user=sample_user(2))
+
+        res = self.client.get(SUMMARY_URL, {"user": 2})
+
+        self.assertEqual(
+            res.data,
+            {"last_borrowing": None, "overdue": [], "outstanding_fines": "0.00"},
+        )
+
 
 class AdminBorrowingApiTests(TestCase):
     def setUp(self):
@@ -190,7 +267,7 @@ class AdminBorrowingApiTests(TestCase):
         sample_borrowing(2, user=self.user)
 
         res = self.client.get(BORROWING_URL)
-        self.assertNotEquals(res.data, [])
+        self.assertNotEquals(res.data["results"], [])
 
     def test_list_returned_borrowings_allowed(self):
         """Admin should be able to see all borrowings, incl. unpaid, cancelled and returned"""
@@ -198,7 +275,7 @@ class AdminBorrowingApiTests(TestCase):
         sample_borrowing(2, user=self.user, returned=date.today())
 
         res = self.client.get(BORROWING_URL)
-        self.assertNotEquals(res.data, [])
+        self.assertNotEquals(res.data["results"], [])
 
     def test_list_cancelled_borrowings_allowed(self):
         """Admin should be able to see all borrowings, incl. unpaid, cancelled and returned"""
@@ -206,7 +283,18 @@ class AdminBorrowingApiTests(TestCase):
         sample_borrowing(2, user=self.user, cancelled=True)
 
         res = self.client.get(BORROWING_URL)
-        self.assertNotEquals(res.data, [])
+        self.assertNotEquals(res.data["results"], [])
+
+    def test_loan_summary_of_user(self):
+        borrowing = sample_borrowing(
+            1, user=sample_user(2), expected_return_date=date.today()
+        )
+
+        res = self.client.get(SUMMARY_URL, {"user": borrowing.user_id})
+
+        self.assertEqual(
+            res.data["last_borrowing"], BorrowingSummarySerializer(borrowing).data
+        )
 
     def test_filter_borrowings_by_user_id(self):
         borrowing1 = sample_borrowing(1, user=self.user)
@@ -219,9 +307,9 @@ class AdminBorrowingApiTests(TestCase):
         serializer2 = BorrowingListSerializer(borrowing2)
         serializer3 = BorrowingListSerializer(borrowing3)
 
-        self.assertNotIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertNotIn(serializer1.data, res.data["results"])
+        self.assertIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
 
     def test_filter_borrowings_by_returned_status(self):
         borrowing1 = sample_borrowing(1, user=self.user, returned=date.today())
@@ -235,13 +323,13 @@ class AdminBorrowingApiTests(TestCase):
         serializer2 = BorrowingListSerializer(borrowing2)
         serializer3 = BorrowingListSerializer(borrowing3)
 
-        self.assertIn(serializer1.data, res1.data)
-        self.assertNotIn(serializer2.data, res1.data)
-        self.assertNotIn(serializer3.data, res1.data)
+        self.assertIn(serializer1.data, res1.data["results"])
+        self.assertNotIn(serializer2.data, res1.data["results"])
+        self.assertNotIn(serializer3.data, res1.data["results"])
 
-        self.assertNotIn(serializer1.data, res2.data)
-        self.assertIn(serializer2.data, res2.data)
-        self.assertIn(serializer3.data, res2.data)
+        self.assertNotIn(serializer1.data, res2.data["results"])
+        self.assertIn(serializer2.data, res2.data["results"])
+        self.assertIn(serializer3.data, res2.data["results"])
 
     def test_filter_borrowings_by_fines_applied(self):
         borrowing1 = sample_borrowing(1, user=self.user, fines_applied=2.5)
@@ -255,13 +343,13 @@ class AdminBorrowingApiTests(TestCase):
         serializer2 = BorrowingListSerializer(borrowing2)
         serializer3 = BorrowingListSerializer(borrowing3)
 
-        self.assertIn(serializer1.data, res1.data)
-        self.assertNotIn(serializer2.data, res1.data)
-        self.assertNotIn(serializer3.data, res1.data)
+        self.assertIn(serializer1.data, res1.data["results"])
+        self.assertNotIn(serializer2.data, res1.data["results"])
+        self.assertNotIn(serializer3.data, res1.data["results"])
 
-        self.assertNotIn(serializer1.data, res2.data)
-        self.assertIn(serializer2.data, res2.data)
-        self.assertIn(serializer3.data, res2.data)
+        self.assertNotIn(serializer1.data, res2.data["results"])
+        self.assertIn(serializer2.data, res2.data["results"])
+        self.assertIn(serializer3.data, res2.data["results"])
 
 
 class BorrowingReturnTestCase(TestCase):
@@ -300,3 +388,300 @@ class BorrowingReturnTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
         self.assertEqual(borrowing.book.inventory, initial_book_inventory)
+
+
+class CalculateFinesDailyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+
+    def test_fines_applied_to_overdue_borrowings(self):
+        today = date.today()
+        overdue = sample_borrowing(
+            1,
+            user=self.user,
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today - timedelta(days=3),
+        )
+        returned = sample_borrowing(
+            2,
+            user=self.user,
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today - timedelta(days=3),
+            returned=today,
+        )
+        not_due = sample_borrowing(
+            3,
+            user=self.user,
+            borrow_date=today,
+            expected_return_date=today + timedelta(days=3),
+        )
+
+        result = apply_overdue_fines()
+
+        self.assertEqual(result["updated"], 1)
+        for borrowing in (overdue, returned, not_due):
+            borrowing.refresh_from_db()
+
+        self.assertEqual(overdue.fines_applied, calculate_fines(overdue.id))
+        self.assertIsNone(returned.fines_applied)
+        self.assertIsNone(not_due.fines_applied)
+
+    def test_unchanged_fines_not_updated(self):
+        today = date.today()
+        sample_borrowing(
+            1,
+            user=self.user,
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today - timedelta(days=1),
+        )
+
+        self.assertEqual(apply_overdue_fines()["updated"], 1)
+        self.assertEqual(apply_overdue_fines()["updated"], 0)
+        self.assertEqual(apply_overdue_fines(today + timedelta(days=1))["updated"], 1)
+
+
+def sample_card():
+    return {
+        "card_number": 42424242,
+        "expiry_month": 12,
+        "expiry_year": 2030,
+        "cvc": 123,
+    }
+
+
+def payment_payload(borrowing_id):
+    return {**sample_card(), "borrowing": borrowing_id}
+
+
+class PaymentCheckoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        self.profile = Profile.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+        self.borrowing = sample_borrowing(1, user=self.user)
+
+    def checkout(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(PAYMENT_URL, payment_payload(self.borrowing.id))
+        return res, callbacks
+
+    @mock.patch("borrowings.views.charge_payment")
+    def test_checkout_records_pending_payment(self, charge):
+        res, callbacks = self.checkout()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data["status"], Payment.PENDING)
+        charge.delay.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        charge.delay.assert_called_once_with(res.data["id"])
+
+        self.borrowing.refresh_from_db()
+        self.assertFalse(self.borrowing.paid)
+        self.assertEqual(self.borrowing.book.inventory, 9)
+
+        status_res = self.client.get(res["Location"])
+        self.assertEqual(status_res.data["status"], Payment.PENDING)
+
+    def test_second_checkout_while_pending_rejected(self):
+        self.checkout()
+        res, callbacks = self.checkout()
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(callbacks, [])
+
+    @mock.patch("borrowings.tasks.stripe_card_payment")
+    def test_successful_charge_marks_borrowing_paid(self, stripe_payment):
+        stripe_payment.return_value = {
+            "message": "Payment succeeded",
+            "status": status.HTTP_200_OK,
+            "stripe_payment_id": "pi_test",
+        }
+        res, _ = self.checkout()
+
+        self.assertEqual(charge_payment(res.data["id"]), Payment.SUCCEEDED)
+
+        self.borrowing.refresh_from_db()
+        self.assertTrue(self.borrowing.paid)
+        self.assertEqual(self.borrowing.payment_id, res.data["id"])
+        self.assertEqual(self.borrowing.book.inventory, 9)
+        (event,) = OutboxEvent.objects.filter(type=OutboxEvent.BORROWING_PAID)
+        self.assertEqual(event.payload["borrowing_id"], self.borrowing.id)
+        self.assertEqual(event.payload["user_id"], self.user.id)
+
+        status_res = self.client.get(res["Location"])
+        self.assertEqual(status_res.data["status"], Payment.SUCCEEDED)
+
+    @mock.patch("borrowings.tasks.stripe_card_payment")
+    def test_failed_charge_releases_inventory(self, stripe_payment):
+        stripe_payment.return_value = {
+            "error": "Payment failed: card declined",
+            "status": status.HTTP_400_BAD_REQUEST,
+        }
+        res, _ = self.checkout()
+
+        self.assertEqual(charge_payment(res.data["id"]), Payment.FAILED)
+        self.assertEqual(charge_payment(res.data["id"]), Payment.FAILED)
+
+        self.borrowing.refresh_from_db()
+        self.assertFalse(self.borrowing.paid)
+        self.assertEqual(self.borrowing.book.inventory, 10)
+        stripe_payment.assert_called_once()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @mock.patch("borrowings.tasks.stripe_card_payment")
+    def test_unreachable_gateway_keeps_payment_pending(self, stripe_payment):
+        stripe_payment.side_effect = [
+            PaymentGatewayError("Payment gateway is unavailable"),
+            {
+                "message": "Payment succeeded",
+                "status": status.HTTP_200_OK,
+                "stripe_payment_id": "pi_test",
+            },
+        ]
+        res, _ = self.checkout()
+
+        with self.assertRaises(PaymentGatewayError):
+            charge_payment(res.data["id"])
+
+        payment = Payment.objects.get(pk=res.data["id"])
+        self.assertEqual(payment.status, Payment.PENDING)
+        self.borrowing.refresh_from_db()
+        self.assertEqual(self.borrowing.book.inventory, 9)
+
+        self.assertEqual(charge_payment(res.data["id"]), Payment.SUCCEEDED)
+        keys = {call.kwargs["idempotency_key"] for call in stripe_payment.mock_calls}
+        self.assertEqual(keys, {f"payment-{res.data['id']}"})
+
+    @mock.patch("borrowings.tasks.charge_payment")
+    def test_stale_pending_payment_enqueued_again(self, charge):
+        res, _ = self.checkout()
+        fresh = sample_borrowing(2, user=self.user)
+        self.client.post(PAYMENT_URL, payment_payload(fresh.id))
+
+        Payment.objects.filter(pk=res.data["id"]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(retry_pending_charges(), {"payments": 1, "fines": 0})
+        charge.delay.assert_called_once_with(res.data["id"])
+
+
+class ValuesListSerializerTests(TestCase):
+    def setUp(self):
+        self.user = sample_user(1)
+        self.user.profile.first_name = "Jane"
+        self.user.profile.last_name = "Doe"
+        self.user.profile.save()
+
+        self.borrowing = sample_borrowing(
+            1,
+            user=self.user,
+            paid=True,
+            returned=date(2024, 4, 20),
+            fines_applied=Decimal("6.72"),
+        )
+        sample_borrowing(2, user=self.user)
+
+        self.payment = Payment.objects.create(
+            borrowing=self.borrowing,
+            user=self.user,
+            amount_paid=Decimal("64.40"),
+            stripe_payment_id="pi_test",
+            **sample_card(),
+        )
+        Fines.objects.create(
+            borrowing=self.borrowing,
+            user=self.user,
+            payment=self.payment,
+            fines_paid=Decimal("6.72"),
+            **sample_card(),
+        )
+
+    def assertRendersIdentically(self, queryset, serializer_class, values_serializer):
+        renderer = JSONRenderer()
+        expected = serializer_class(
+            queryset, many=True, context={"request": mock.Mock(user=self.user)}
+        ).data
+        fast = values_serializer.to_representation(values_serializer.values(queryset))
+
+        self.assertEqual(renderer.render(fast), renderer.render(expected))
+
+    def test_borrowing_list(self):
+        self.assertRendersIdentically(
+            Borrowing.objects.all(), BorrowingListSerializer, borrowing_list_values
+        )
+
+    def test_payment_list(self):
+        self.assertRendersIdentically(
+            Payment.objects.all(), PaymentListSerializer, payment_list_values
+        )
+
+    def test_fines_list(self):
+        self.assertRendersIdentically(
+            Fines.objects.all(), FinesListSerializer, fines_list_values
+        )
+
+
+def export_url(basename, export_format="csv"):
+    url = reverse(f"borrowings:{basename}-export")
+    return f"{url}?export_format={export_format}"
+
+
+class ExportApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_user(
+            "admin@admin.com", "testpass", is_superuser=True
+        )
+        Profile.objects.create(user=self.admin)
+        self.user = sample_user(1)
+
+        for i in range(3):
+            borrowing = sample_borrowing(i, user=self.user, paid=True)
+            Payment.objects.create(
+                borrowing=borrowing,
+                user=self.admin if i else self.user,
+                amount_paid=Decimal("10.00"),
+                **sample_card(),
+            )
+
+    def export(self, basename, export_format="csv"):
+        res = self.client.get(export_url(basename, export_format))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode()
+
+    def test_export_csv(self):
+        self.client.force_authenticate(self.admin)
+
+        lines = self.export("borrowings").splitlines()
+
+        self.assertEqual(lines[0].split(","), borrowing_list_values.field_names)
+        self.assertEqual(len(lines), 4)
+
+    def test_export_ndjson_matches_list(self):
+        self.client.force_authenticate(self.admin)
+
+        lines = self.export("payments", "ndjson").splitlines()
+        rows = [json.loads(line) for line in lines]
+        listed = self.client.get(PAYMENT_URL).data["results"]
+
+        self.assertEqual(rows, json.loads(JSONRenderer().render(listed)))
+
+    def test_export_only_includes_own_rows(self):
+        self.client.force_authenticate(self.user)
+
+        rows = self.export("payments", "ndjson").splitlines()
+
+        self.assertEqual(len(rows), 1)
+
+    def test_export_unknown_format(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.client.get(export_url("fines", "xlsx"))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,73 @@
+import threading
+import time
+from unittest import mock
+
+from celery.contrib.testing.worker import start_worker
+from django.test import SimpleTestCase
+
+from borrowings.tasks import (
+    calculate_fines_daily,
+    charge_fines,
+    charge_payment,
+    notify_about_borrowing_create,
+    retry_pending_charges,
+)
+from library_api_service.celery import app as celery_app
+
+NOTIFICATIONS = 200
+TELEGRAM_LATENCY = 0.02
+
+
+def queue_of(task):
+    return celery_app.amqp.router.route({}, task.name)["queue"].name
+
+
+class CeleryQueueTests(SimpleTestCase):
+    def test_tasks_are_routed_to_their_queues(self):
+        self.assertEqual(queue_of(notify_about_borrowing_create), "notifications")
+        self.assertEqual(queue_of(calculate_fines_daily), "fines")
+        self.assertEqual(queue_of(charge_payment), "payments")
+        self.assertEqual(queue_of(charge_fines), "payments")
+        self.assertEqual(queue_of(retry_pending_charges), "payments")
+
+    def test_notifications_are_not_starved_during_fines_run(self):
+        """Notifications keep flowing while a fines run occupies its worker."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_fines_run():
+            started.set()
+            release.wait(30)
+            return {}
+
+        def send_message(borrowing_id, user_id):
+            time.sleep(TELEGRAM_LATENCY)
+
+        with mock.patch(
+            "borrowings.tasks.apply_overdue_fines", side_effect=slow_fines_run
+        ), mock.patch.object(
+            notify_about_borrowing_create, "run", side_effect=send_message
+        ), start_worker(
+            celery_app, pool="solo", queues=["fines"], perform_ping_check=False
+        ), start_worker(
+            celery_app,
+            pool="threads",
+            concurrency=8,
+            queues=["notifications"],
+            perform_ping_check=False,
+        ):
+            fines = calculate_fines_daily.delay()
+            self.assertTrue(started.wait(10), "Fines run did not start")
+
+            try:
+                notifications = [
+                    notify_about_borrowing_create.delay(i, i)
+                    for i in range(NOTIFICATIONS)
+                ]
+                for result in notifications:
+                    result.get(timeout=10)
+
+                self.assertFalse(fines.ready())
+            finally:
+                release.set()
+            fines.get(timeout=10)
@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+
+from borrowings.models import Borrowing, Payment, Fines
+from library.models import Book
+from user.models import Profile
+
+
+class Rollback(Exception):
+    pass
+
+
+class GenerateDataCommandTests(TestCase):
+    def generate(self, **options):
+        options = {"users": 30, "books": 10, "borrowings": 500, "workers": 1, **options}
+        call_command("generate_data", stdout=StringIO(), **options)
+
+    def snapshot(self, **options):
+        try:
+            with transaction.atomic():
+                self.generate(**options)
+                rows = list(
+                    Borrowing.objects.order_by("id").values_list(
+                        "borrow_date", "returned", "fines_applied", "book__title"
+                    )
+                )
+                raise Rollback
+        except Rollback:
+            return rows
+
+    def test_generate_data(self):
+        self.generate()
+
+        self.assertEqual(get_user_model().objects.count(), 30)
+        self.assertEqual(Profile.objects.count(), 30)
+        self.assertEqual(Book.objects.count(), 10)
+        self.assertEqual(Borrowing.objects.count(), 500)
+        self.assertEqual(
+            Payment.objects.count(), Borrowing.objects.filter(paid=True).count()
+        )
+        self.assertEqual(
+            Fines.objects.count(), Borrowing.objects.filter(fines_paid=True).count()
+        )
+        self.assertTrue(Borrowing.objects.filter(returned__isnull=True).exists())
+
+        user = get_user_model().objects.first()
+        self.assertTrue(user.check_password("synthetic"))
+
+    def test_new_rows_get_fresh_ids(self):
+        self.generate()
+        book = Book.objects.create(
+            title="After", author="Generate", inventory=1, daily_fee=1
+        )
+
+        others = Book.objects.exclude(pk=book.pk).values_list("id", flat=True)
+        self.assertGreater(book.id, max(others))
+
+    def test_same_seed_generates_same_data(self):
+        self.assertEqual(self.snapshot(seed=1), self.snapshot(seed=1))
+        self.assertNotEqual(self.snapshot(seed=1), self.snapshot(seed=2))
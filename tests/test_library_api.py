@@ -1,12 +1,19 @@
 from decimal import Decimal, ROUND_UP
+from unittest import mock
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from library.cache import get_cache_stats
 from library.models import Book
+from library.pagination import ModelOrderingCursorPagination
+from library.utils import decrement_inventory
 from library.serializers import BookSerializer, BookListSerializer, BookDetailSerializer
 
 BOOK_URL = reverse("library:books-list")
@@ -50,6 +57,7 @@ class UnauthenticatedBookApiTests(TestCase):
 
 class AuthenticatedBookApiTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "test@test.com",
@@ -67,7 +75,7 @@ class AuthenticatedBookApiTests(TestCase):
         serializer = BookListSerializer(books, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_filter_books_by_title(self):
         book1 = sample_book(3, title="name1")
@@ -80,9 +88,47 @@ class AuthenticatedBookApiTests(TestCase):
         serializer2 = BookListSerializer(book2)
         serializer3 = BookListSerializer(book3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data["results"])
+        self.assertIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
+
+    def test_search_books_by_title_and_author(self):
+        book1 = sample_book(1, title="The Hobbit", author="J. R. R. Tolkien")
+        book2 = sample_book(2, title="Tolkien: A Biography", author="Carpenter")
+        sample_book(3, title="Dune", author="Frank Herbert")
+
+        res = self.client.get(BOOK_URL, {"search": "tolkien"})
+
+        ids = [book["id"] for book in res.data["results"]]
+        self.assertEqual(sorted(ids), sorted([book1.id, book2.id]))
+        self.assertEqual(ids[0], book2.id)
+
+    def test_search_books_paginated_past_equal_ranks(self):
+        Book.objects.bulk_create(
+            Book(
+                title=f"Sample book{i:04}",
+                author="J. R. R. Tolkien",
+                inventory=10,
+                daily_fee=2.8,
+            )
+            for i in range(1150)
+        )
+
+        res = self.client.get(BOOK_URL, {"search": "tolkien", "page_size": 100})
+        seen = [book["id"] for book in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += [book["id"] for book in res.data["results"]]
+
+        self.assertEqual(seen, sorted(Book.objects.values_list("id", flat=True)))
+
+    def test_search_books_with_typo(self):
+        book = sample_book(1, title="The Hobbit", author="J. R. R. Tolkien")
+        sample_book(2, title="Dune", author="Frank Herbert")
+
+        res = self.client.get(BOOK_URL, {"search": "hobit"})
+
+        self.assertEqual([book["id"] for book in res.data["results"]], [book.id])
 
     def test_retrieve_book_detail(self):
         book = sample_book(6)
@@ -98,6 +144,60 @@ class AuthenticatedBookApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_list_books_paginated_by_cursor(self):
+        for i in range(5):
+            sample_book(i)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(BOOK_URL, {"page_size": 2})
+
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNone(res.data["previous"])
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in queries.captured_queries)
+        )
+
+        seen = [book["id"] for book in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += [book["id"] for book in res.data["results"]]
+
+        books = Book.objects.all()
+        self.assertEqual(seen, [book.id for book in books])
+
+    def test_list_books_paginated_past_same_author_ties(self):
+        Book.objects.bulk_create(
+            Book(
+                title=f"Sample book{i:04}",
+                author="Sample author",
+                inventory=10,
+                daily_fee=2.8,
+            )
+            for i in range(1150)
+        )
+
+        res = self.client.get(BOOK_URL, {"page_size": 100})
+        seen = [book["id"] for book in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += [book["id"] for book in res.data["results"]]
+
+        self.assertEqual(len(seen), 1150)
+        self.assertEqual(seen, [book.id for book in Book.objects.order_by("title")])
+
+        res = self.client.get(res.data["previous"])
+        self.assertEqual([book["id"] for book in res.data["results"]], seen[1000:1100])
+
+    def test_page_size_capped(self):
+        for i in range(3):
+            sample_book(i)
+
+        with mock.patch.object(ModelOrderingCursorPagination, "max_page_size", 2):
+            res = self.client.get(BOOK_URL, {"page_size": 1000})
+
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNotNone(res.data["next"])
+
 
 class AdminBookApiTests(TestCase):
     def setUp(self):
@@ -115,3 +215,53 @@ class AdminBookApiTests(TestCase):
         book = Book.objects.get(id=res.data["id"])
         for key in payload_var:
             self.assertEqual(payload_var[key], getattr(book, key))
+
+
+class BookCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(1)
+
+    def test_repeated_list_served_from_cache(self):
+        res1 = self.client.get(BOOK_URL, {"title": "Sample"})
+        with self.assertNumQueries(0):
+            res2 = self.client.get(BOOK_URL, {"title": "Sample"})
+
+        self.assertEqual(res1["X-Cache"], "MISS")
+        self.assertEqual(res2["X-Cache"], "HIT")
+        self.assertEqual(res1.data, res2.data)
+        self.assertEqual(get_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_query_params_cached_separately(self):
+        self.client.get(BOOK_URL, {"title": "Sample"})
+        res = self.client.get(BOOK_URL, {"title": "other"})
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"], [])
+
+    def test_book_save_invalidates_cache(self):
+        self.client.get(detail_url(self.book.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = "Changed"
+            self.book.save()
+        res = self.client.get(detail_url(self.book.id))
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["title"], "Changed")
+
+    def test_inventory_change_invalidates_cache(self):
+        self.client.get(BOOK_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            decrement_inventory(self.book.id)
+        res = self.client.get(BOOK_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"][0]["inventory"], 9)
@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from library.models import Book
+from tests.test_library_api import sample_book
+
+
+class ImportBooksCommandTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def import_books(self, path, *args):
+        out = StringIO()
+        call_command("import_books", path, *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_import_csv_upserts_on_author_and_title(self):
+        sample_book(1, inventory=1)
+        path = self.write(
+            "books.csv",
+            "title,author,cover,inventory,daily_fee\n"
+            "Sample book1,Sample author1,H,7,2.50\n"
+            "New Title,New Author,S,3,1.00\n",
+        )
+
+        output = self.import_books(path, "--batch-size", "1")
+
+        self.assertIn("2 rows read, 2 upserted, 0 rejected", output)
+        self.assertEqual(Book.objects.count(), 2)
+        updated = Book.objects.get(title="Sample book1")
+        self.assertEqual(updated.inventory, 7)
+        self.assertEqual(updated.daily_fee, Decimal("2.50"))
+        self.assertTrue(Book.objects.filter(title="New Title").exists())
+
+    def test_duplicate_rows_in_a_batch_keep_the_last_one(self):
+        path = self.write(
+            "books.jsonl",
+            '{"title": "T", "author": "A", "inventory": 1, "daily_fee": "1.00"}\n'
+            '{"title": "T", "author": "A", "inventory": 5, "daily_fee": "1.00"}\n',
+        )
+
+        self.import_books(path)
+
+        self.assertEqual(Book.objects.get(title="T").inventory, 5)
+
+    def test_rejected_rows_are_written_to_error_report(self):
+        path = self.write(
+            "books.jsonl",
+            '{"title": "Good", "author": "A", "inventory": 1, "daily_fee": "1.00"}\n'
+            '{"title": "Bad", "author": "A", "inventory": -1, "daily_fee": "1.00"}\n'
+            "not json\n",
+        )
+
+        output = self.import_books(path)
+
+        self.assertIn("3 rows read, 1 upserted, 2 rejected", output)
+        self.assertEqual(list(Book.objects.values_list("title", flat=True)), ["Good"])
+        with open(f"{path}.errors.jsonl", encoding="utf-8") as file:
+            errors = [json.loads(line) for line in file]
+        self.assertEqual([error["line"] for error in errors], [2, 3])
+        self.assertIn("inventory", errors[0]["errors"])
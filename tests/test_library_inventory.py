@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from library.utils import decrement_inventory, increment_inventory
+from tests.test_library_api import sample_book
+
+
+CHECKOUTS = 300
+WORKERS = 20
+
+
+def run_concurrently(func, book_id, times):
+    def call(_):
+        try:
+            return func(book_id)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        return list(executor.map(call, range(times)))
+
+
+class ConcurrentInventoryTests(TransactionTestCase):
+    def test_concurrent_checkouts_do_not_oversell(self):
+        book = sample_book(1, inventory=250)
+
+        results = run_concurrently(decrement_inventory, book.id, CHECKOUTS)
+
+        book.refresh_from_db()
+        self.assertEqual(results.count(True), 250)
+        self.assertEqual(results.count(False), CHECKOUTS - 250)
+        self.assertEqual(book.inventory, 0)
+
+    def test_concurrent_returns_are_not_lost(self):
+        book = sample_book(1, inventory=0)
+
+        run_concurrently(increment_inventory, book.id, CHECKOUTS)
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, CHECKOUTS)
+
+    def test_decrement_out_of_stock(self):
+        book = sample_book(1, inventory=0)
+
+        self.assertFalse(decrement_inventory(book.id))
+
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
@@ -0,0 +1,91 @@
+import time
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase
+
+from user.mail import FakeSMTPBackend, MailDispatcher, get_mailer
+from user.tasks import send_email
+
+BACKEND = "user.mail.FakeSMTPBackend"
+
+
+def sample_message(i=1):
+    return EmailMessage("Subject", f"Body {i}", "from@test.com", [f"to{i}@test.com"])
+
+
+class FlakyBackend(FakeSMTPBackend):
+    """Drops the connection on the first message it is given."""
+
+    failures = 1
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+class MailDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        FakeSMTPBackend.opened = 0
+
+    def test_burst_shares_connections(self):
+        dispatcher = MailDispatcher(BACKEND, max_connections=2, send_latency=0.01)
+
+        futures = [dispatcher.submit(sample_message(i)) for i in range(20)]
+        for future in futures:
+            future.result(5)
+
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertLessEqual(FakeSMTPBackend.opened, 2)
+
+    def test_idle_connection_closed(self):
+        dispatcher = MailDispatcher(BACKEND, max_connections=1, idle_timeout=0.05)
+
+        dispatcher.submit(sample_message(1)).result(5)
+        time.sleep(0.2)
+        dispatcher.submit(sample_message(2)).result(5)
+
+        self.assertEqual(FakeSMTPBackend.opened, 2)
+
+    def test_dropped_connection_reopened(self):
+        FlakyBackend.failures = 1
+        dispatcher = MailDispatcher("tests.test_mail.FlakyBackend", max_connections=1)
+
+        dispatcher.submit(sample_message()).result(5)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(FakeSMTPBackend.opened, 2)
+
+    def test_second_failure_reported(self):
+        FlakyBackend.failures = 2
+        dispatcher = MailDispatcher("tests.test_mail.FlakyBackend", max_connections=1)
+
+        with self.assertRaises(SMTPServerDisconnected):
+            dispatcher.submit(sample_message()).result(5)
+        self.assertEqual(mail.outbox, [])
+
+
+class SendEmailTaskTests(SimpleTestCase):
+    def setUp(self):
+        get_mailer.cache_clear()
+        self.addCleanup(get_mailer.cache_clear)
+
+    def test_email_sent(self):
+        send_email("Verification Code", "Your code", ["reader@test.com"])
+
+        (message,) = mail.outbox
+        self.assertEqual(message.to, ["reader@test.com"])
+
+    @mock.patch("user.tasks.get_mailer")
+    def test_unreachable_server_retried(self, get_mailer):
+        get_mailer().submit.side_effect = ConnectionRefusedError()
+
+        with mock.patch.object(send_email, "retry", side_effect=Exception) as retry:
+            with self.assertRaises(Exception):
+                send_email("Verification Code", "Your code", ["reader@test.com"])
+
+        retry.assert_called_once()
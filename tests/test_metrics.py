@@ -0,0 +1,136 @@
+from unittest import mock
+
+from celery.contrib.testing.worker import start_worker
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowings.gateways import FakeGateway
+from borrowings.tasks import calculate_fines_daily
+from library_api_service.celery import app as celery_app
+from tests.test_library_api import BOOK_URL, sample_book
+
+METRICS_URL = reverse("metrics")
+METRICS_TOKEN = "scrape-token"
+METRICS_AUTH = {"HTTP_AUTHORIZATION": f"Bearer {METRICS_TOKEN}"}
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        self.client.force_authenticate(self.user)
+
+    def test_request_metrics_are_labelled_by_route(self):
+        sample_book(1)
+        labels = {"method": "GET", "route": "library:books-list", "status": "200"}
+        before = sample_value("http_request_duration_seconds_count", **labels)
+        queries_before = sample_value(
+            "db_queries_per_request_sum", route="library:books-list"
+        )
+
+        self.client.get(BOOK_URL)
+
+        self.assertEqual(
+            sample_value("http_request_duration_seconds_count", **labels), before + 1
+        )
+        self.assertGreater(
+            sample_value("db_queries_per_request_sum", route="library:books-list"),
+            queries_before,
+        )
+
+    @override_settings(METRICS_TOKEN=METRICS_TOKEN)
+    def test_metrics_endpoint(self):
+        self.client.get(BOOK_URL)
+
+        res = self.client.get(METRICS_URL, **METRICS_AUTH)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b"http_request_duration_seconds_bucket", res.content)
+        self.assertIn(b"http_requests_in_progress", res.content)
+
+    @override_settings(METRICS_TOKEN=METRICS_TOKEN)
+    def test_metrics_endpoint_requires_token(self):
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_endpoint_disabled_without_token(self):
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer None")
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_payment_gateway_calls_are_timed(self):
+        labels = {
+            "service": "fake_gateway",
+            "operation": "create_payment_intent",
+            "outcome": "success",
+        }
+        before = sample_value("external_call_duration_seconds_count", **labels)
+
+        FakeGateway().create_payment_intent(100, "usd")
+
+        self.assertEqual(
+            sample_value("external_call_duration_seconds_count", **labels), before + 1
+        )
+
+
+FINES_TASK = calculate_fines_daily.name
+
+
+class CeleryMetricsTests(SimpleTestCase):
+    @mock.patch("borrowings.tasks.apply_overdue_fines", return_value={})
+    def test_task_runtime_is_recorded(self, _):
+        labels = {"task": FINES_TASK, "state": "SUCCESS"}
+        before = sample_value("celery_task_runtime_seconds_count", **labels)
+
+        calculate_fines_daily.apply()
+
+        self.assertEqual(
+            sample_value("celery_task_runtime_seconds_count", **labels), before + 1
+        )
+
+    @mock.patch("borrowings.tasks.apply_overdue_fines", side_effect=ValueError)
+    def test_task_failures_are_counted(self, _):
+        labels = {"task": FINES_TASK, "exception": "ValueError"}
+        before = sample_value("celery_task_failures_total", **labels)
+
+        calculate_fines_daily.apply()
+
+        self.assertEqual(
+            sample_value("celery_task_failures_total", **labels), before + 1
+        )
+
+    @mock.patch("borrowings.tasks.apply_overdue_fines", return_value={})
+    def test_queue_wait_is_recorded_by_worker(self, _):
+        labels = {"task": FINES_TASK, "queue": "fines"}
+        before = sample_value("celery_task_queue_wait_seconds_count", **labels)
+
+        with start_worker(
+            celery_app, pool="solo", queues=["fines"], perform_ping_check=False
+        ):
+            calculate_fines_daily.delay().get(timeout=10)
+
+        self.assertEqual(
+            sample_value("celery_task_queue_wait_seconds_count", **labels), before + 1
+        )
+
+    @override_settings(METRICS_TOKEN=METRICS_TOKEN)
+    def test_queue_depth_is_exported(self):
+        res = self.client.get(METRICS_URL, **METRICS_AUTH)
+
+        self.assertIn(b'celery_queue_depth{queue="celery"}', res.content)
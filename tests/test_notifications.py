@@ -0,0 +1,105 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from borrowings.notifications import (
+    FakeTelegramTransport,
+    NotificationDispatcher,
+    TelegramRetryAfter,
+    TokenBucket,
+    get_dispatcher,
+)
+from borrowings.tasks import notify_about_borrowing_create
+from tests.test_borrowings_api import sample_borrowing
+from user.models import Profile
+
+FAKE_TELEGRAM = {
+    "transport": "borrowings.notifications.FakeTelegramTransport",
+    "chat_rate": 10,
+}
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_reservations_are_paced(self):
+        bucket = TokenBucket(rate=10)
+
+        waits = [bucket.reserve() for _ in range(3)]
+
+        self.assertEqual(waits[0], 0)
+        self.assertAlmostEqual(waits[1], 0.1, places=2)
+        self.assertAlmostEqual(waits[2], 0.2, places=2)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=10)
+
+        bucket.pause(2)
+
+        self.assertAlmostEqual(bucket.reserve(), 2, places=2)
+
+
+class NotificationDispatcherTests(SimpleTestCase):
+    def test_messages_to_waiting_chat_are_coalesced(self):
+        transport = FakeTelegramTransport(chat_rate=10)
+        dispatcher = NotificationDispatcher(transport, chat_rate=10)
+
+        dispatcher.submit(1, "first").result(5)
+        futures = [dispatcher.submit(1, text) for text in ("second", "third")]
+        for future in futures:
+            future.result(5)
+
+        self.assertEqual(transport.sent, [(1, "first"), (1, "second\n\nthird")])
+
+    def test_rate_limits_are_respected(self):
+        transport = FakeTelegramTransport(global_rate=100, chat_rate=10)
+        dispatcher = NotificationDispatcher(transport, global_rate=100, chat_rate=10)
+
+        started = time.monotonic()
+        futures = [dispatcher.submit(i % 20, f"message {i}") for i in range(60)]
+        for future in futures:
+            future.result(10)
+
+        self.assertEqual(transport.rejected, 0)
+        self.assertGreaterEqual(
+            time.monotonic() - started, (len(transport.sent) - 1) / 100
+        )
+
+    def test_too_many_requests_is_retried_after_delay(self):
+        transport = mock.Mock()
+        transport.send_message.side_effect = [TelegramRetryAfter(0.2), None]
+        dispatcher = NotificationDispatcher(transport)
+
+        started = time.monotonic()
+        dispatcher.submit(1, "hello").result(5)
+
+        self.assertEqual(transport.send_message.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_retries_give_up(self):
+        transport = mock.Mock()
+        transport.send_message.side_effect = TelegramRetryAfter(0.01)
+        dispatcher = NotificationDispatcher(transport, max_retries=2)
+
+        with self.assertRaises(TelegramRetryAfter):
+            dispatcher.submit(1, "hello").result(5)
+        self.assertEqual(transport.send_message.call_count, 3)
+
+
+@override_settings(TELEGRAM=FAKE_TELEGRAM)
+class NotifyTaskTests(TestCase):
+    def setUp(self):
+        get_dispatcher.cache_clear()
+        self.addCleanup(get_dispatcher.cache_clear)
+
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        Profile.objects.create(user=self.user, telegram_chat_id="42")
+        self.borrowing = sample_borrowing(1, user=self.user)
+
+    def test_notification_sent_through_dispatcher(self):
+        with self.assertNumQueries(1):
+            notify_about_borrowing_create(self.borrowing.id, self.user.id)
+
+        ((chat_id, text),) = get_dispatcher().transport.sent
+        self.assertEqual(chat_id, "42")
+        self.assertIn(self.borrowing.book.title, text)
@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from borrowings.models import OutboxEvent
+from borrowings.outbox import (
+    REDELIVERY_TIMEOUT,
+    publish_pending_events,
+    record_event,
+)
+from borrowings.tasks import handle_outbox_event
+from borrowings.utils import apply_overdue_fines
+from tests.test_borrowings_api import return_borrowing_url, sample_borrowing
+from user.models import Profile
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        Profile.objects.create(user=self.user)
+
+    def test_event_rolled_back_with_transaction(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            record_event(OutboxEvent.BORROWING_PAID, borrowing_id=1, user_id=1)
+            raise ValueError
+
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_return_records_event(self):
+        today = date.today()
+        borrowing = sample_borrowing(
+            1,
+            user=self.user,
+            paid=True,
+            borrow_date=today,
+            expected_return_date=today + timedelta(days=7),
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.post(
+            return_borrowing_url(borrowing.id), {"to_return": "I return it"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        (event,) = OutboxEvent.objects.all()
+        self.assertEqual(event.type, OutboxEvent.BORROWING_RETURNED)
+        self.assertEqual(event.payload["borrowing_id"], borrowing.id)
+        self.assertFalse(event.payload["overdue"])
+
+    def test_fine_assessed_only_once(self):
+        today = date.today()
+        borrowing = sample_borrowing(
+            1,
+            user=self.user,
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today - timedelta(days=2),
+        )
+
+        apply_overdue_fines()
+        apply_overdue_fines(today + timedelta(days=1))
+
+        (event,) = OutboxEvent.objects.all()
+        borrowing.refresh_from_db()
+        self.assertEqual(event.type, OutboxEvent.FINE_ASSESSED)
+        self.assertEqual(event.payload["borrowing_id"], borrowing.id)
+        self.assertEqual(event.payload["amount"], "6.72")
+
+    @mock.patch("borrowings.tasks.handle_outbox_event.apply_async")
+    def test_relay_publishes_each_event_once(self, apply_async):
+        events = [
+            record_event(OutboxEvent.REFUND_ISSUED, payment_id=i) for i in range(5)
+        ]
+
+        self.assertEqual(publish_pending_events(batch_size=2), 5)
+        self.assertEqual(publish_pending_events(batch_size=2), 0)
+
+        task_ids = [call.kwargs["task_id"] for call in apply_async.call_args_list]
+        self.assertEqual(task_ids, [str(event.id) for event in events])
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True))
+
+    @mock.patch("borrowings.tasks.notify_about_borrowing_create")
+    def test_redelivered_event_handled_once(self, notify):
+        event = record_event(
+            OutboxEvent.BORROWING_PAID, borrowing_id=3, user_id=self.user.id
+        )
+        args = (str(event.id), event.type, event.payload)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(handle_outbox_event(*args))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(handle_outbox_event(*args))
+
+        notify.delay.assert_called_once_with(3, self.user.id)
+
+    def test_failed_handler_retried(self):
+        event = record_event(OutboxEvent.BORROWING_PAID, borrowing_id=3)
+        handler = mock.Mock(side_effect=[RuntimeError("handler failed"), None])
+
+        with mock.patch.dict(
+            "borrowings.tasks.EVENT_HANDLERS", {OutboxEvent.BORROWING_PAID: [handler]}
+        ):
+            result = handle_outbox_event.apply(
+                (str(event.id), event.type, event.payload)
+            )
+
+        self.assertTrue(result.get())
+        self.assertEqual(handler.call_count, 2)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.handled_at)
+
+    @mock.patch("borrowings.tasks.handle_outbox_event.apply_async")
+    def test_unhandled_event_published_again(self, apply_async):
+        event = record_event(OutboxEvent.BORROWING_PAID, borrowing_id=3)
+        publish_pending_events()
+
+        with mock.patch.dict(
+            "borrowings.tasks.EVENT_HANDLERS",
+            {OutboxEvent.BORROWING_PAID: [mock.Mock(side_effect=RuntimeError)]},
+        ), self.assertRaises(RuntimeError):
+            handle_outbox_event(str(event.id), event.type, event.payload)
+
+        event.refresh_from_db()
+        self.assertIsNone(event.handled_at)
+        self.assertEqual(publish_pending_events(), 0)
+
+        OutboxEvent.objects.filter(pk=event.pk).update(
+            published_at=timezone.now() - REDELIVERY_TIMEOUT - timedelta(seconds=1)
+        )
+        self.assertEqual(publish_pending_events(), 1)
+        self.assertEqual(apply_async.call_count, 2)
@@ -0,0 +1,98 @@
+from unittest import mock
+
+import stripe
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+
+from borrowings.gateways import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FakeGateway,
+    PaymentGatewayError,
+    get_gateway,
+)
+from borrowings.utils import stripe_card_payment
+
+
+FAKE_GATEWAY = {"backend": "borrowings.gateways.FakeGateway", "seed": 1}
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        failing = mock.Mock(side_effect=PaymentGatewayError("down"))
+
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayError):
+                breaker.call(failing)
+
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(failing)
+        self.assertEqual(failing.call_count, 2)
+
+    def test_closes_after_successful_trial_call(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+
+        with self.assertRaises(PaymentGatewayError):
+            breaker.call(mock.Mock(side_effect=PaymentGatewayError("down")))
+
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.assertIsNone(breaker.opened_at)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_closes_after_declined_trial_call(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        declined = stripe.error.CardError("Your card was declined.", None, "declined")
+
+        with self.assertRaises(PaymentGatewayError):
+            breaker.call(mock.Mock(side_effect=PaymentGatewayError("down")))
+        with self.assertRaises(stripe.error.CardError):
+            breaker.call(mock.Mock(side_effect=declined))
+
+        self.assertIsNone(breaker.opened_at)
+        self.assertEqual(breaker.failures, 0)
+
+
+class FakeGatewayTests(SimpleTestCase):
+    def test_idempotent_payment_intent(self):
+        gateway = FakeGateway()
+
+        first = gateway.create_payment_intent(100, "usd", "payment-1")
+        second = gateway.create_payment_intent(100, "usd", "payment-1")
+
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(first.status, "succeeded")
+
+    def test_declined_payment(self):
+        gateway = FakeGateway(failure_rate=1)
+
+        intent = gateway.create_payment_intent(100, "usd")
+
+        self.assertEqual(intent.status, "requires_payment_method")
+
+    @override_settings(PAYMENT_GATEWAY=FAKE_GATEWAY)
+    def test_stripe_card_payment_uses_configured_gateway(self):
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+
+        response = stripe_card_payment(2.5, idempotency_key="payment-1")
+
+        self.assertEqual(response["status"], status.HTTP_200_OK)
+        self.assertTrue(response["stripe_payment_id"].startswith("pi_fake_"))
+
+    @override_settings(PAYMENT_GATEWAY={**FAKE_GATEWAY, "outage_rate": 1})
+    def test_stripe_card_payment_raises_when_unreachable(self):
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+
+        with self.assertRaises(PaymentGatewayError):
+            stripe_card_payment(2.5, idempotency_key="payment-1")
+
+    @override_settings(PAYMENT_GATEWAY={**FAKE_GATEWAY, "failure_rate": 1})
+    def test_stripe_card_payment_returns_decline(self):
+        get_gateway.cache_clear()
+        self.addCleanup(get_gateway.cache_clear)
+
+        response = stripe_card_payment(2.5, idempotency_key="payment-1")
+
+        self.assertEqual(response["status"], status.HTTP_400_BAD_REQUEST)
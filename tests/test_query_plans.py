@@ -0,0 +1,169 @@
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from borrowings.models import Borrowing, Payment, Fines, Reminder
+from borrowings.reminders import reminder_candidates
+from borrowings.summary import loan_summary
+from borrowings.utils import apply_overdue_fines
+from library.models import Book
+from tests.test_borrowings_api import sample_card
+from user.models import Profile
+
+USERS = 50
+BOOKS = 200
+BORROWINGS = 20000
+
+
+def seq_scans(plan):
+    """Return the tables read with a sequential scan anywhere in a plan."""
+    tables = []
+    if plan["Node Type"] == "Seq Scan":
+        tables.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        tables.extend(seq_scans(child))
+    return tables
+
+
+class QueryPlanTests(TestCase):
+    """Guard the hot Borrowing, Payment and Fines queries against full scans.
+
+    The tables are seeded with a realistic shape: most borrowings are
+    returned, and each user owns a small share of the rows. Statistics
+    are refreshed with ANALYZE before the plans are checked.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"plan@plan{i}.com") for i in range(USERS)
+        )
+        Profile.objects.bulk_create(Profile(user=user) for user in users)
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Plan book {i}",
+                author="Plan author",
+                inventory=10,
+                daily_fee=Decimal("1.00"),
+            )
+            for i in range(BOOKS)
+        )
+
+        today = date.today()
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                borrow_date=today - timedelta(days=400 - i % 400),
+                expected_return_date=today - timedelta(days=390 - i % 400),
+                returned=None if i % 50 == 0 else today,
+                paid=True,
+                book=books[i % BOOKS],
+                user=users[i % USERS],
+            )
+            for i in range(BORROWINGS)
+        )
+        payments = Payment.objects.bulk_create(
+            Payment(
+                borrowing=borrowing,
+                user=borrowing.user,
+                amount_paid=Decimal("10.00"),
+                **sample_card(),
+            )
+            for borrowing in borrowings
+        )
+        Fines.objects.bulk_create(
+            Fines(
+                borrowing=payment.borrowing,
+                payment=payment,
+                user=payment.user,
+                fines_paid=Decimal("1.00"),
+                **sample_card(),
+            )
+            for payment in payments[::10]
+        )
+
+        with connection.cursor() as cursor:
+            for model in (Borrowing, Payment, Fines):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+        cls.user = users[0]
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+
+    def assertNoSeqScan(self, sql, params=()):
+        tables = {model._meta.db_table for model in (Borrowing, Payment, Fines)}
+        scanned = [
+            table for table in seq_scans(self.explain(sql, params)) if table in tables
+        ]
+        self.assertEqual(scanned, [], f"Sequential scan in plan for:\n{sql}")
+
+    def assertEndpointUsesIndexes(self, url, table):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if f'FROM "{table}"' in query["sql"]
+        ]
+        self.assertTrue(queries, f"No query on {table} for {url}")
+        for sql in queries:
+            self.assertNoSeqScan(sql)
+
+    def test_borrowing_list(self):
+        self.assertEndpointUsesIndexes(
+            reverse("borrowings:borrowings-list"), Borrowing._meta.db_table
+        )
+
+    def test_payment_list(self):
+        self.assertEndpointUsesIndexes(
+            reverse("borrowings:payments-list"), Payment._meta.db_table
+        )
+
+    def test_fines_list(self):
+        self.assertEndpointUsesIndexes(
+            reverse("borrowings:fines-list"), Fines._meta.db_table
+        )
+
+    def test_apply_overdue_fines(self):
+        with CaptureQueriesContext(connection) as context:
+            apply_overdue_fines()
+
+        table = f'"{Borrowing._meta.db_table}"'
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if f"FROM {table}" in query["sql"] or f"UPDATE {table}" in query["sql"]
+        ]
+        self.assertEqual(len(queries), 2)
+        for sql in queries:
+            self.assertNoSeqScan(sql)
+
+    def test_loan_summary(self):
+        with CaptureQueriesContext(connection) as context:
+            loan_summary(self.user.id)
+
+        (query,) = context.captured_queries
+        self.assertNoSeqScan(query["sql"])
+
+    def test_reminder_candidates(self):
+        for kind in (Reminder.DUE_TOMORROW, Reminder.OVERDUE):
+            queryset = reminder_candidates(kind).values_list("id", flat=True)
+            sql, params = queryset.query.sql_with_params()
+
+            self.assertNoSeqScan(sql, params)
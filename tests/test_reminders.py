@@ -0,0 +1,128 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from borrowings.models import Borrowing, Reminder
+from borrowings.notifications import get_dispatcher
+from borrowings.reminders import (
+    OVERDUE_LOOKBACK,
+    dispatch_reminders,
+    record_reminders,
+    send_reminder_batch,
+)
+from borrowings.tasks import schedule_reminders
+from tests.test_borrowings_api import sample_borrowing
+from tests.test_notifications import FAKE_TELEGRAM
+from user.models import Profile
+
+
+@override_settings(TELEGRAM=FAKE_TELEGRAM)
+class ReminderTests(TestCase):
+    def setUp(self):
+        get_dispatcher.cache_clear()
+        self.addCleanup(get_dispatcher.cache_clear)
+
+        self.today = date.today()
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        Profile.objects.create(user=self.user, telegram_chat_id="42")
+
+    def borrowing(self, i, due, user=None, **params):
+        return sample_borrowing(
+            i,
+            user=user or self.user,
+            borrow_date=self.today - timedelta(days=30),
+            expected_return_date=self.today + timedelta(days=due),
+            **params,
+        )
+
+    def test_reminders_recorded_once(self):
+        due_tomorrow = self.borrowing(1, due=1)
+        overdue = self.borrowing(2, due=-1)
+        self.borrowing(3, due=2)
+        self.borrowing(4, due=-OVERDUE_LOOKBACK.days - 1)
+        self.borrowing(5, due=1, returned=self.today)
+        no_chat = get_user_model().objects.create_user("no@chat.com", "testpass")
+        Profile.objects.create(user=no_chat)
+        self.borrowing(6, due=1, user=no_chat)
+
+        self.assertEqual(record_reminders(), 2)
+        self.assertEqual(record_reminders(), 0)
+
+        self.assertEqual(
+            set(Reminder.objects.values_list("borrowing_id", "kind")),
+            {
+                (due_tomorrow.id, Reminder.DUE_TOMORROW),
+                (overdue.id, Reminder.OVERDUE),
+            },
+        )
+
+    def test_conflicting_reminders_not_counted(self):
+        for i in range(2):
+            self.borrowing(i, due=1)
+        self.assertEqual(record_reminders(), 2)
+
+        def candidates(kind, today=None):
+            if kind == Reminder.DUE_TOMORROW:
+                return Borrowing.objects.all()
+            return Borrowing.objects.none()
+
+        with mock.patch(
+            "borrowings.reminders.reminder_candidates", side_effect=candidates
+        ):
+            self.assertEqual(record_reminders(), 0)
+        self.assertEqual(Reminder.objects.count(), 2)
+
+    def test_reminders_dispatched_once(self):
+        for i in range(5):
+            self.borrowing(i, due=1)
+        record_reminders()
+        send = mock.Mock()
+
+        self.assertEqual(dispatch_reminders(send, batch_size=2), 3)
+        self.assertEqual(dispatch_reminders(send, batch_size=2), 0)
+
+        dispatched = [pk for call in send.call_args_list for pk in call.args[0]]
+        self.assertCountEqual(dispatched, Reminder.objects.values_list("id", flat=True))
+
+    def test_reminders_to_chat_sent_as_one_message(self):
+        for i in range(3):
+            self.borrowing(i, due=1)
+        record_reminders()
+        ids = list(Reminder.objects.values_list("id", flat=True))
+
+        with self.assertNumQueries(2):
+            self.assertEqual(send_reminder_batch(ids), 3)
+        self.assertEqual(send_reminder_batch(ids), 0)
+
+        ((chat_id, text),) = get_dispatcher().transport.sent
+        self.assertEqual(chat_id, "42")
+        self.assertEqual(text.count("is due tomorrow"), 3)
+        self.assertFalse(Reminder.objects.filter(sent_at__isnull=True).exists())
+
+    def test_stale_reminders_skipped(self):
+        self.borrowing(1, due=1)
+        overdue = self.borrowing(2, due=-1)
+        returned = self.borrowing(3, due=-2)
+        record_reminders()
+        returned.returned = self.today
+        returned.save()
+        ids = list(Reminder.objects.values_list("id", flat=True))
+        send = mock.Mock()
+
+        next_day = self.today + timedelta(days=1)
+        self.assertEqual(dispatch_reminders(send, today=next_day), 1)
+        self.assertEqual(send_reminder_batch(ids, today=next_day), 1)
+
+        (sent,) = Reminder.objects.filter(sent_at__isnull=False)
+        self.assertEqual(sent.borrowing_id, overdue.id)
+        self.assertEqual(send.call_args.args[0], [sent.id])
+
+    @mock.patch("borrowings.tasks.send_reminders")
+    def test_scheduled_campaign(self, send_reminders):
+        self.borrowing(1, due=1)
+
+        self.assertEqual(schedule_reminders(), {"recorded": 1, "batches": 1})
+        self.assertEqual(schedule_reminders(), {"recorded": 0, "batches": 0})
+        send_reminders.delay.assert_called_once()
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import re
+from datetime import date, timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from telegram import Update
+from telegram.request import BaseRequest
+
+from tests.test_borrowings_api import sample_borrowing
+from user.bot import MemoryStateStore, build_application
+from user.mail import get_mailer
+from user.models import Profile
+from user.tasks import send_email
+
+
+class FakeBotApi(BaseRequest):
+    """Answers Bot API calls in process and records them."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls.append((name, params))
+
+        if name == "getMe":
+            result = {
+                "id": 1,
+                "is_bot": True,
+                "first_name": "Library",
+                "username": "library_bot",
+            }
+        elif name == "sendMessage":
+            result = {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": params["chat_id"], "type": "private"},
+                "text": params["text"],
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    def sent(self, chat_id):
+        return [
+            params["text"]
+            for name, params in self.calls
+            if name == "sendMessage" and params["chat_id"] == chat_id
+        ]
+
+
+def message_update(chat_id, text, update_id=1):
+    entities = (
+        [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        if text.startswith("/")
+        else []
+    )
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Jane"},
+            "text": text,
+            "entities": entities,
+        },
+    }
+
+
+def callback_update(chat_id, data, update_id=1):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Jane"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "What do you want to do?",
+            },
+        },
+    }
+
+
+@override_settings(TELEGRAM={"bot_token": "123:abc"})
+class TelegramBotTests(TransactionTestCase):
+    def setUp(self):
+        get_mailer.cache_clear()
+        self.addCleanup(get_mailer.cache_clear)
+        patcher = mock.patch("user.bot.send_email")
+        patcher.start().delay.side_effect = send_email
+        self.addCleanup(patcher.stop)
+
+        self.api = FakeBotApi()
+        self.users = [
+            get_user_model().objects.create_user(f"reader{i}@test.com", "testpass")
+            for i in range(2)
+        ]
+        for user in self.users:
+            Profile.objects.create(user=user)
+
+    async def send(self, application, update):
+        await application.process_update(Update.de_json(update, application.bot))
+
+    async def verify(self, application, chat_id, email):
+        await self.send(application, message_update(chat_id, "/start"))
+        await self.send(application, message_update(chat_id, email))
+        (message,) = [message for message in mail.outbox if email in message.to]
+        code = re.search(r"\d{6}", message.body).group()
+        await self.send(application, message_update(chat_id, code))
+
+    @async_to_sync
+    async def test_conversation(self):
+        today = date.today()
+        borrowing = await asyncio.to_thread(
+            sample_borrowing,
+            1,
+            user=self.users[0],
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today - timedelta(days=1),
+        )
+
+        async with build_application(MemoryStateStore(), self.api) as application:
+            await self.verify(application, 10, "reader0@test.com")
+            await self.send(application, callback_update(10, "check_overdue"))
+
+        sent = self.api.sent(10)
+        self.assertEqual(sent[0], "Please enter your email.")
+        self.assertIn("Verification successful!", sent)
+        self.assertIn(borrowing.book.title, sent[-1])
+        profile = await Profile.objects.aget(user=self.users[0])
+        self.assertEqual(profile.telegram_chat_id, "10")
+
+    @async_to_sync
+    async def test_overdue_borrowings_paginated(self):
+        today = date.today()
+        for i in range(12):
+            await asyncio.to_thread(
+                sample_borrowing,
+                i,
+                user=self.users[0],
+                borrow_date=today - timedelta(days=10),
+                expected_return_date=today - timedelta(days=1),
+            )
+
+        async with build_application(MemoryStateStore(), self.api) as application:
+            await self.verify(application, 10, "reader0@test.com")
+            await self.send(application, callback_update(10, "check_overdue"))
+            await self.send(application, callback_update(10, "check_overdue:2"))
+
+        first_page = self.api.sent(10)[-1]
+        self.assertEqual(first_page.count("Should have been returned by"), 10)
+        self.assertIn("Page 1 of 2", first_page)
+        ((_, edit),) = [call for call in self.api.calls if call[0] == "editMessageText"]
+        self.assertEqual(edit["text"].count("Should have been returned by"), 2)
+        self.assertIn("Page 2 of 2", edit["text"])
+
+    @async_to_sync
+    async def test_concurrent_conversations_are_separate(self):
+        async with build_application(MemoryStateStore(), self.api) as application:
+            await asyncio.gather(
+                self.verify(application, 10, "reader0@test.com"),
+                self.verify(application, 20, "reader1@test.com"),
+            )
+
+        for i, chat_id in enumerate((10, 20)):
+            self.assertIn("Verification successful!", self.api.sent(chat_id))
+            profile = await Profile.objects.aget(user=self.users[i])
+            self.assertEqual(profile.telegram_chat_id, str(chat_id))
+
+    @mock.patch("user.bot.generate_verification_code", return_value="123456")
+    @async_to_sync
+    async def test_unverified_chat(self, generate_verification_code):
+        async with build_application(MemoryStateStore(), self.api) as application:
+            await self.send(application, message_update(10, "unknown@test.com"))
+            await self.send(application, message_update(10, "reader0@test.com"))
+            await self.send(application, message_update(10, "654321"))
+            await self.send(application, callback_update(10, "check_last"))
+
+        self.assertEqual(
+            self.api.sent(10),
+            [
+                "Your email does not exist in our database",
+                "A verification code has been sent to reader0@test.com."
+                " Please enter the code here.",
+                "Verification code incorrect. Please try again.",
+                "Please enter your email.",
+            ],
+        )
+
+
+class MemoryStateStoreTests(SimpleTestCase):
+    @async_to_sync
+    async def test_values_expire(self):
+        store = MemoryStateStore()
+
+        await store.set("kept", "value", ttl=60)
+        await store.set("expired", "value", ttl=-1)
+
+        self.assertEqual(await store.get("kept"), "value")
+        self.assertIsNone(await store.get("expired"))
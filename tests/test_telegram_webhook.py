@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tests.test_telegram_bot import FakeBotApi
+from user.bot import MemoryStateStore, WebhookRunner, build_application
+from user.tasks import handle_telegram_update
+
+WEBHOOK_URL = reverse("user:telegram-webhook")
+SECRET = "webhook-secret"
+
+
+def sample_update(update_id=1, text="/start"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 5, "type": "private"},
+            "from": {"id": 5, "is_bot": False, "first_name": "Jane"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+
+@override_settings(TELEGRAM={"bot_token": "123:abc", "webhook_secret": SECRET})
+class TelegramWebhookTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def post(self, data, secret=SECRET):
+        return self.client.post(
+            WEBHOOK_URL,
+            data,
+            format="json",
+            HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret,
+        )
+
+    @mock.patch("user.views.handle_telegram_update")
+    def test_wrong_secret_rejected(self, handle):
+        res = self.post(sample_update(), secret="wrong")
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        handle.delay.assert_not_called()
+
+    @mock.patch("user.views.handle_telegram_update")
+    def test_update_queued_once(self, handle):
+        for _ in range(2):
+            res = self.post(sample_update())
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        handle.delay.assert_called_once_with(sample_update())
+
+    @mock.patch("user.views.handle_telegram_update")
+    def test_update_not_queued_accepted_again(self, handle):
+        handle.delay.side_effect = [ConnectionError("broker unavailable"), None]
+
+        with self.assertRaises(ConnectionError):
+            self.post(sample_update())
+        res = self.post(sample_update())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(handle.delay.call_count, 2)
+
+    def test_update_dispatched_to_handlers(self):
+        api = FakeBotApi()
+        runner = WebhookRunner(build_application(MemoryStateStore(), api))
+
+        with mock.patch("user.bot.get_webhook_runner", return_value=runner):
+            handle_telegram_update(sample_update())
+
+        self.assertEqual(api.sent(5), ["Please enter your email."])
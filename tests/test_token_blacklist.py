@@ -0,0 +1,218 @@
+from datetime import timedelta
+from unittest import mock
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+import redis
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from user.blacklist import (
+    MemoryBloomFilter,
+    RedisBloomFilter,
+    delete_expired_tokens,
+    get_blacklist_filter,
+    rebuild_blacklist_filter,
+)
+from user.tasks import compact_token_blacklist
+
+REFRESH_URL = reverse("user:token_refresh")
+LOGOUT_URL = reverse("user:logout")
+
+
+def sample_outstanding_token(expires_in, blacklisted=False):
+    token = OutstandingToken.objects.create(
+        jti=uuid4().hex,
+        token="token",
+        expires_at=timezone.now() + timedelta(days=expires_in),
+    )
+    if blacklisted:
+        BlacklistedToken.objects.create(token=token)
+    return token
+
+
+class FakeRedis:
+    """The few Redis commands used by RedisBloomFilter, kept in a dict.
+
+    The next pipeline that runs the fail_on command raises as if Redis
+    were unreachable.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.fail_on = None
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def rename(self, src, dst):
+        self.data[dst] = self.data.pop(src)
+
+    def setbit(self, key, offset, value):
+        bits = self.data.setdefault(key, set())
+        (bits.add if value else bits.discard)(offset)
+
+    def getbit(self, key, offset):
+        return int(offset in self.data.get(key, ()))
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+        return lambda *args: self.commands.append((command, args))
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        if any(command.__name__ == self.client.fail_on for command, _ in commands):
+            self.client.fail_on = None
+            raise redis.ConnectionError("Redis is unreachable")
+        return [command(*args) for command, args in commands]
+
+
+class MemoryBloomFilterTests(SimpleTestCase):
+    def test_unbuilt_filter_defers_to_database(self):
+        bloom = MemoryBloomFilter(capacity=1000)
+
+        self.assertTrue(bloom.might_contain("any"))
+
+    def test_members_found(self):
+        bloom = MemoryBloomFilter(capacity=1000, error_rate=0.01)
+        members = [uuid4().hex for _ in range(1000)]
+
+        bloom.rebuild(members[:500])
+        for jti in members[500:]:
+            bloom.add(jti)
+
+        self.assertTrue(all(bloom.might_contain(jti) for jti in members))
+        false_positives = sum(bloom.might_contain(uuid4().hex) for _ in range(2000))
+        self.assertLess(false_positives, 60)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        get_blacklist_filter.cache_clear()
+        self.addCleanup(get_blacklist_filter.cache_clear)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def refresh_token(self, token):
+        return self.client.post(REFRESH_URL, {"refresh": str(token)}, format="json")
+
+    def test_refresh_skips_blacklist_lookup(self):
+        compact_token_blacklist()
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.refresh_token(self.refresh)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [
+                query
+                for query in context.captured_queries
+                if BlacklistedToken._meta.db_table in query["sql"]
+            ]
+        )
+
+    def test_blacklisted_token_rejected(self):
+        for built in (False, True):
+            if built:
+                compact_token_blacklist()
+            refresh = RefreshToken.for_user(self.user)
+
+            res = self.client.post(
+                LOGOUT_URL, {"refresh_token": str(refresh)}, format="json"
+            )
+            self.assertEqual(res.status_code, status.HTTP_205_RESET_CONTENT)
+
+            res = self.refresh_token(refresh)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_tokens_compacted(self):
+        for i in range(5):
+            sample_outstanding_token(expires_in=-1, blacklisted=i % 2 == 0)
+        kept = sample_outstanding_token(expires_in=1, blacklisted=True)
+
+        self.assertEqual(delete_expired_tokens(batch_size=2), 5)
+        self.assertEqual(rebuild_blacklist_filter(), 1)
+
+        self.assertCountEqual(
+            OutstandingToken.objects.values_list("jti", flat=True),
+            [kept.jti, self.refresh["jti"]],
+        )
+        self.assertTrue(get_blacklist_filter().might_contain(kept.jti))
+        self.assertFalse(get_blacklist_filter().might_contain(self.refresh["jti"]))
+
+
+@override_settings(
+    TOKEN_BLACKLIST_FILTER={
+        "backend": "user.blacklist.RedisBloomFilter",
+        "url": "redis://redis:6379/1",
+        "capacity": 1000,
+    }
+)
+class RedisBloomFilterTests(TestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch("redis.Redis.from_url", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        get_blacklist_filter.cache_clear()
+        self.addCleanup(get_blacklist_filter.cache_clear)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("test@test.com", "testpass")
+
+    def test_token_rejected_when_filter_add_fails(self):
+        rebuild_blacklist_filter()
+        refresh = RefreshToken.for_user(self.user)
+
+        self.redis.fail_on = "setbit"
+        res = self.client.post(
+            LOGOUT_URL, {"refresh_token": str(refresh)}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_205_RESET_CONTENT)
+
+        res = self.client.post(REFRESH_URL, {"refresh": str(refresh)}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        rebuild_blacklist_filter()
+        self.assertTrue(get_blacklist_filter().might_contain(refresh["jti"]))
+        self.assertFalse(self.redis.exists("token-blacklist-filter:degraded"))
+
+    def test_filter_built_during_failed_add_dropped(self):
+        bloom = RedisBloomFilter("redis://redis:6379/1", capacity=1000)
+
+        def jtis():
+            yield "kept"
+            self.redis.fail_on = "exists"
+            bloom.add("missed")
+
+        bloom.rebuild(jtis())
+
+        self.assertFalse(self.redis.exists(bloom.key))
+        self.assertTrue(bloom.might_contain("missed"))
@@ -105,7 +105,7 @@ class AuthenticatedProfileApiTests(TestCase):
         serializer = ProfileListSerializer(profiles, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_filter_profiles_by_user(self):
         profile1 = sample_profile(last_name="sur1")
@@ -118,9 +118,9 @@ class AuthenticatedProfileApiTests(TestCase):
         serializer2 = ProfileListSerializer(profile2)
         serializer3 = ProfileListSerializer(profile3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data["results"])
+        self.assertIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
 
     def test_retrieve_profile_detail(self):
         profile = sample_profile()
@@ -194,7 +194,7 @@ class AuthenticatedProfileApiTests(TestCase):
             self.client.post(url, {"image": ntf}, format="multipart")
         res = self.client.get(PROFILE_URL)
 
-        self.assertIn("image", res.data[0].keys())
+        self.assertIn("image", res.data["results"][0].keys())
 
 
 class AdminProfileApiTests(TestCase):
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Profile
+
+PRINCIPAL_FIELDS = (
+    "id",
+    "email",
+    "is_active",
+    "is_staff",
+    "is_superuser",
+    "profile__id",
+    "profile__first_name",
+    "profile__last_name",
+)
+
+
+def principal_key(user_id):
+    return f"principal:{user_id}"
+
+
+def forget_principal(user_id):
+    cache.delete(principal_key(user_id))
+
+
+def load_principal(user_id):
+    """Return the fields authentication needs, read from the database once
+    per PRINCIPAL_CACHE_TIMEOUT. Returns None for an unknown user."""
+    key = principal_key(user_id)
+    principal = cache.get(key)
+    if principal is None:
+        principal = (
+            get_user_model()
+            .objects.filter(pk=user_id)
+            .values(*PRINCIPAL_FIELDS)
+            .first()
+        )
+        if principal is None:
+            return None
+        cache.set(key, principal, settings.PRINCIPAL_CACHE_TIMEOUT)
+    return principal
+
+
+def build_user(principal):
+    """Build the user and its profile from cached fields.
+
+    The user compares equal to the stored one and can be used in queries
+    and as a foreign key value. It only has the cached fields, so views
+    that change the user have to read it from the database.
+    """
+    user = get_user_model()(
+        id=principal["id"],
+        email=principal["email"],
+        is_active=principal["is_active"],
+        is_staff=principal["is_staff"],
+        is_superuser=principal["is_superuser"],
+    )
+    user._state.adding = False
+    user._state.db = "default"
+
+    if principal["profile__id"] is not None:
+        profile = Profile(
+            id=principal["profile__id"],
+            first_name=principal["profile__first_name"],
+            last_name=principal["profile__last_name"],
+        )
+        profile._state.adding = False
+        profile._state.db = "default"
+        user.profile = profile
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication that does not query the database per request.
+
+    The user comes from the token's user id and a short-lived cache entry,
+    which is dropped whenever the user or their profile is saved and on
+    logout.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        principal = load_principal(user_id)
+        if principal is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not principal["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return build_user(principal)
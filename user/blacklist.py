@@ -0,0 +1,223 @@
+import hashlib
+import math
+import threading
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+COMPACTION_BATCH_SIZE = 1000
+# Tokens blacklisted this long before a rebuild started are added to the
+# new filter again, in case their transaction committed after it read
+# the blacklist.
+REBUILD_OVERLAP = timedelta(minutes=5)
+
+
+def bloom_size(capacity, error_rate):
+    """Return the number of bits and of hash functions of a Bloom filter."""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class BloomFilter(ABC):
+    """Bloom filter of token ids: no false negatives, rare false positives.
+
+    Subclasses store the bits. A filter that has not been built yet, or
+    whose store fails, reports every token as possibly present, so the
+    caller falls back to the database.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01, **options):
+        self.bits, self.hashes = bloom_size(capacity, error_rate)
+
+    def positions(self, jti):
+        digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    @abstractmethod
+    def rebuild(self, jtis):
+        """Replace the filter with one holding exactly jtis."""
+
+    @abstractmethod
+    def add(self, jti):
+        """Add a token id to the filter."""
+
+    @abstractmethod
+    def might_contain(self, jti):
+        """Return False only if the token id is certainly not in the filter."""
+
+
+class MemoryBloomFilter(BloomFilter):
+    """Per-process filter, for development and tests.
+
+    Only safe with a single process: tokens blacklisted by another
+    process are never added to it.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.array = None
+        self._lock = threading.Lock()
+
+    def rebuild(self, jtis):
+        array = bytearray(math.ceil(self.bits / 8))
+        for jti in jtis:
+            self._set(array, jti)
+        with self._lock:
+            self.array = array
+
+    def _set(self, array, jti):
+        for position in self.positions(jti):
+            array[position // 8] |= 1 << (position % 8)
+
+    def add(self, jti):
+        with self._lock:
+            if self.array is not None:
+                self._set(self.array, jti)
+
+    def might_contain(self, jti):
+        array = self.array
+        if array is None:
+            return True
+        return all(
+            array[position // 8] & (1 << (position % 8))
+            for position in self.positions(jti)
+        )
+
+
+class RedisBloomFilter(BloomFilter):
+    """Filter kept in a Redis bitmap shared by every process."""
+
+    def __init__(self, url, key="token-blacklist-filter", **options):
+        super().__init__(**options)
+        self.redis = redis.Redis.from_url(url, socket_timeout=1)
+        self.key = key
+        self.building = f"{key}:building"
+        self.degraded = f"{key}:degraded"
+
+    def rebuild(self, jtis):
+        # Allocates the whole bitmap, so an empty blacklist still has one,
+        # and lets add() write to it while it is being built.
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self.building, self.degraded)
+        pipe.setbit(self.building, self.bits - 1, 0)
+        pipe.execute()
+
+        for i, jti in enumerate(jtis, 1):
+            for position in self.positions(jti):
+                pipe.setbit(self.building, position, 1)
+            if i % COMPACTION_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+        self.redis.rename(self.building, self.key)
+        # A token that add() failed to write while this filter was being
+        # built may be missing from it, so it is dropped again.
+        if self.redis.exists(self.degraded):
+            self.redis.delete(self.key)
+
+    def add(self, jti):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.exists(self.key)
+            pipe.exists(self.building)
+            keys = [
+                key
+                for key, exists in zip((self.key, self.building), pipe.execute())
+                if exists
+            ]
+            for key in keys:
+                for position in self.positions(jti):
+                    pipe.setbit(key, position, 1)
+            pipe.execute()
+        except redis.RedisError:
+            # A filter without the token's bits would let it through, so it
+            # is dropped and checks go to the database until the next
+            # rebuild. If that fails too, so does blacklisting the token.
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(self.degraded, 1)
+            pipe.delete(self.key)
+            pipe.execute()
+
+    def might_contain(self, jti):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.exists(self.key)
+            for position in self.positions(jti):
+                pipe.getbit(self.key, position)
+            built, *bits = pipe.execute()
+        except redis.RedisError:
+            return True
+        return not built or all(bits)
+
+
+@lru_cache(maxsize=None)
+def get_blacklist_filter():
+    """Return the filter configured in TOKEN_BLACKLIST_FILTER."""
+    options = dict(settings.TOKEN_BLACKLIST_FILTER)
+    return import_string(options.pop("backend"))(**options)
+
+
+def rebuild_blacklist_filter():
+    """Rebuild the filter from the blacklist. Returns the number of tokens."""
+    started = timezone.now()
+    blacklist_filter = get_blacklist_filter()
+    jtis = BlacklistedToken.objects.values_list("token__jti", flat=True)
+
+    count = 0
+
+    def counted(jtis):
+        nonlocal count
+        for jti in jtis:
+            count += 1
+            yield jti
+
+    blacklist_filter.rebuild(
+        counted(jtis.order_by().iterator(chunk_size=COMPACTION_BATCH_SIZE))
+    )
+    for jti in jtis.filter(blacklisted_at__gte=started - REBUILD_OVERLAP):
+        blacklist_filter.add(jti)
+    return count
+
+
+def delete_expired_tokens(batch_size=COMPACTION_BATCH_SIZE):
+    """Delete expired outstanding tokens, and their blacklist entries, in
+    batches of batch_size. Returns the number of tokens deleted.
+
+    Tokens are walked in id order: they all live as long, so the expired
+    ones come first and each batch stops at the first unexpired token.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+class FilteredRefreshToken(RefreshToken):
+    """Refresh token that asks the blacklist filter before the database."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if get_blacklist_filter().might_contain(jti):
+            super().check_blacklist()
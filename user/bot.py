@@ -0,0 +1,288 @@
+import asyncio
+import secrets
+import threading
+import time
+from math import ceil
+from functools import lru_cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from redis import asyncio as aioredis
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import (
+    ApplicationBuilder,
+    CallbackQueryHandler,
+    CommandHandler,
+    MessageHandler,
+    filters,
+)
+
+from borrowings.summary import loan_summary
+from user.models import Profile
+from user.tasks import send_email
+
+SESSION_TTL = 60 * 60 * 24 * 30
+VERIFICATION_CODE_TTL = 60 * 10
+OVERDUE_PAGE_SIZE = 10
+
+CHECK_BORROWINGS_MARKUP = InlineKeyboardMarkup(
+    [
+        [
+            InlineKeyboardButton("Check my last borrowing", callback_data="check_last"),
+            InlineKeyboardButton(
+                "Check my overdue borrowings", callback_data="check_overdue"
+            ),
+        ]
+    ]
+)
+
+
+class MemoryStateStore:
+    """Per-process conversation state, for development and tests."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        if expires_at < time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key, value, ttl):
+        self.data[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+
+class RedisStateStore:
+    """Conversation state shared by every bot process."""
+
+    def __init__(self, url):
+        self.redis = aioredis.from_url(url, decode_responses=True)
+
+    async def get(self, key):
+        return await self.redis.get(key)
+
+    async def set(self, key, value, ttl):
+        await self.redis.set(key, value, ex=ttl)
+
+    async def delete(self, key):
+        await self.redis.delete(key)
+
+
+def get_state_store():
+    url = settings.TELEGRAM.get("state_url")
+    return RedisStateStore(url) if url else MemoryStateStore()
+
+
+def user_key(chat_id):
+    """The id of the user a chat was verified for."""
+    return f"telegram:{chat_id}:user"
+
+
+def pending_key(chat_id):
+    """The verification code sent for a chat, and the email it was sent to."""
+    return f"telegram:{chat_id}:pending"
+
+
+def in_thread_pool(func):
+    """Run blocking Django code off the event loop.
+
+    The thread's connection is released afterwards, as at the end of a
+    request, so idle pool threads do not hold on to connections.
+    """
+
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return wraps(func)(sync_to_async(run, thread_sensitive=False))
+
+
+@in_thread_pool
+def email_exists(email):
+    return get_user_model().objects.filter(email=email).exists()
+
+
+@in_thread_pool
+def link_chat(email, chat_id):
+    """Link the chat to the user's profile and return the user's id."""
+    user_id = get_user_model().objects.values_list("id", flat=True).get(email=email)
+    Profile.objects.filter(user_id=user_id).update(telegram_chat_id=chat_id)
+    return user_id
+
+
+@in_thread_pool
+def send_verification_code(email, code):
+    send_email.delay("Verification Code", f"Your verification code is: {code}", [email])
+
+
+get_loan_summary = in_thread_pool(loan_summary)
+
+
+def last_borrowing_message(summary):
+    borrowing = summary.last_borrowing
+    if borrowing is None:
+        return "You have no borrowings yet."
+
+    return (
+        f"New borrowing created:\n"
+        f"{borrowing.book.title} by {borrowing.book.author}\n"
+        f"Please return it by:"
+        f" {borrowing.expected_return_date}"
+    )
+
+
+def overdue_page(summary, page):
+    """Render a page of overdue borrowings, with buttons to turn pages."""
+    pages = max(1, ceil(len(summary.overdue) / OVERDUE_PAGE_SIZE))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * OVERDUE_PAGE_SIZE
+
+    lines = [
+        f"{borrowing.book.title} by {borrowing.book.author}\n"
+        f"Should have been returned by:"
+        f" {borrowing.expected_return_date}"
+        for borrowing in summary.overdue[start : start + OVERDUE_PAGE_SIZE]
+    ] or ["You have no overdue borrowings."]
+    if summary.outstanding_fines:
+        lines.append(f"Outstanding fines: ${summary.outstanding_fines}")
+
+    buttons = []
+    if pages > 1:
+        lines.append(f"Page {page} of {pages}")
+        if page > 1:
+            buttons.append(
+                InlineKeyboardButton(
+                    "Previous", callback_data=f"check_overdue:{page - 1}"
+                )
+            )
+        if page < pages:
+            buttons.append(
+                InlineKeyboardButton("Next", callback_data=f"check_overdue:{page + 1}")
+            )
+
+    markup = InlineKeyboardMarkup([buttons]) if buttons else None
+    return "\n\n".join(lines), markup
+
+
+def generate_verification_code():
+    return "".join(secrets.choice("0123456789") for _ in range(6))
+
+
+async def send_welcome(update, context):
+    await update.message.reply_text("Please enter your email.")
+
+
+async def check_borrowings(update, context):
+    query = update.callback_query
+    await query.answer()
+    chat_id = query.message.chat.id
+
+    user_id = await context.bot_data["store"].get(user_key(chat_id))
+    if not user_id:
+        await context.bot.send_message(chat_id, "Please enter your email.")
+        return
+
+    summary = await get_loan_summary(int(user_id))
+    action, _, page = query.data.partition(":")
+    if action == "check_last":
+        await context.bot.send_message(chat_id, last_borrowing_message(summary))
+    elif page:
+        # Turning pages edits the message the buttons belong to.
+        text, markup = overdue_page(summary, int(page))
+        await query.edit_message_text(text, reply_markup=markup)
+    else:
+        text, markup = overdue_page(summary, 1)
+        await context.bot.send_message(chat_id, text, reply_markup=markup)
+
+
+async def verify_email(update, context):
+    store = context.bot_data["store"]
+    chat_id = update.effective_chat.id
+    text = update.message.text.strip()
+    pending = await store.get(pending_key(chat_id))
+
+    if text.isdigit() and pending:
+        code, email = pending.split(":", 1)
+        if text != code:
+            await update.message.reply_text(
+                "Verification code incorrect. Please try again."
+            )
+            return
+
+        await store.delete(pending_key(chat_id))
+        user_id = await link_chat(email, chat_id)
+        await store.set(user_key(chat_id), user_id, SESSION_TTL)
+        await update.message.reply_text("Verification successful!")
+        await update.message.reply_text(
+            "What do you want to do?", reply_markup=CHECK_BORROWINGS_MARKUP
+        )
+    elif await email_exists(text):
+        code = generate_verification_code()
+        await send_verification_code(text, code)
+        await store.set(pending_key(chat_id), f"{code}:{text}", VERIFICATION_CODE_TTL)
+        await update.message.reply_text(
+            f"A verification code has been sent to "
+            f"{text}. Please enter the code here."
+        )
+    else:
+        await update.message.reply_text("Your email does not exist in our database")
+
+
+def build_application(store=None, request=None):
+    """Build the bot. Updates of different chats are handled concurrently."""
+    builder = (
+        ApplicationBuilder()
+        .token(settings.TELEGRAM["bot_token"])
+        .concurrent_updates(True)
+    )
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
+
+    application.bot_data["store"] = store or get_state_store()
+    application.add_handler(CommandHandler(["start", "help"], send_welcome))
+    application.add_handler(
+        CallbackQueryHandler(
+            check_borrowings, pattern=r"^(check_last|check_overdue(:\d+)?)$"
+        )
+    )
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND, verify_email)
+    )
+    return application
+
+
+class WebhookRunner:
+    """Handle webhook updates on an application running in the background.
+
+    The application lives on an event loop in a daemon thread, so every
+    worker thread shares one initialized bot and its connection pool.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.run(application.initialize())
+
+    def run(self, coroutine, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def process_update(self, data, timeout=None):
+        update = Update.de_json(data, self.application.bot)
+        self.run(self.application.process_update(update), timeout)
+
+
+@lru_cache(maxsize=None)
+def get_webhook_runner():
+    """Return the process-wide runner for updates received by the webhook."""
+    return WebhookRunner(build_application())
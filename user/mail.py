@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+
+from library.metrics import observe_external_call
+
+
+class FakeSMTPBackend(LocmemEmailBackend):
+    """Locmem backend that takes as long as an SMTP server, for benchmarks.
+
+    Opening a connection sleeps connect_latency seconds, for the TCP, TLS
+    and login handshake, and every message sleeps send_latency.
+    """
+
+    opened = 0
+    _lock = threading.Lock()
+
+    def __init__(self, connect_latency=0.0, send_latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.connect_latency = connect_latency
+        self.send_latency = send_latency
+        self.connection = None
+
+    def open(self):
+        if self.connection is not None:
+            return False
+        time.sleep(self.connect_latency)
+        with self._lock:
+            FakeSMTPBackend.opened += 1
+        self.connection = True
+        return True
+
+    def close(self):
+        self.connection = None
+
+    def send_messages(self, messages):
+        new_connection = self.open()
+        try:
+            time.sleep(self.send_latency * len(messages))
+            return super().send_messages(messages)
+        finally:
+            if new_connection:
+                self.close()
+
+
+class MailDispatcher:
+    """Send email from sender threads that each keep a connection open.
+
+    Like send_mass_mail(), a burst of messages shares connections instead
+    of paying for an SMTP handshake per message. A connection left idle
+    for idle_timeout seconds is closed. A message that fails is sent once
+    more over a new connection, since the server may have dropped an idle
+    one; a second failure is left to the caller.
+    """
+
+    def __init__(self, backend=None, max_connections=2, idle_timeout=30, **options):
+        self.backend = backend
+        self.options = options
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue()
+
+        for _ in range(max_connections):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, message):
+        """Queue an EmailMessage; the returned future resolves once it is sent."""
+        future = Future()
+        self.queue.put((message, future))
+        return future
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                message, future = self.queue.get(
+                    timeout=self.idle_timeout if connection else None
+                )
+            except queue.Empty:
+                connection = self._close(connection)
+                continue
+
+            for attempt in range(2):
+                try:
+                    if connection is None:
+                        connection = get_connection(
+                            self.backend, fail_silently=False, **self.options
+                        )
+                        with observe_external_call("smtp", "connect"):
+                            connection.open()
+                    with observe_external_call("smtp", "send_message"):
+                        connection.send_messages([message])
+                except Exception as e:
+                    connection = self._close(connection)
+                    error = e
+                else:
+                    future.set_result(None)
+                    break
+            else:
+                future.set_exception(error)
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+@lru_cache(maxsize=None)
+def get_mailer():
+    """Return the process-wide dispatcher configured in EMAIL_DELIVERY."""
+    return MailDispatcher(**settings.EMAIL_DELIVERY)
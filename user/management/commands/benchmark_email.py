@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+
+from user.mail import FakeSMTPBackend, MailDispatcher
+
+BACKEND = "user.mail.FakeSMTPBackend"
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a burst of verification emails against a fake SMTP server with "
+        "realistic handshake and send latencies, once with a new connection "
+        "per message and once through the pooled dispatcher, and report "
+        "throughput and connections opened. No mail server is needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--connect-latency", type=float, default=0.3)
+        parser.add_argument("--send-latency", type=float, default=0.05)
+        parser.add_argument("--max-connections", type=int, default=2)
+        parser.add_argument(
+            "--senders",
+            type=int,
+            default=8,
+            help="Threads sending with a new connection each, like the old bot.",
+        )
+
+    def handle(self, *args, **options):
+        latencies = {
+            "connect_latency": options["connect_latency"],
+            "send_latency": options["send_latency"],
+        }
+        messages = [
+            EmailMessage(
+                "Verification Code",
+                f"Your verification code is: {i:06}",
+                "library@example.com",
+                [f"reader{i}@example.com"],
+            )
+            for i in range(options["messages"])
+        ]
+
+        def send_alone(message):
+            get_connection(BACKEND, **latencies).send_messages([message])
+
+        def per_message():
+            with ThreadPoolExecutor(options["senders"]) as executor:
+                list(executor.map(send_alone, messages))
+
+        def pooled():
+            dispatcher = MailDispatcher(
+                BACKEND, max_connections=options["max_connections"], **latencies
+            )
+            wait([dispatcher.submit(message) for message in messages])
+
+        for name, run in (("per message", per_message), ("pooled", pooled)):
+            FakeSMTPBackend.opened = 0
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name}: {len(messages)} emails in {elapsed:.1f}s, "
+                f"{len(messages) / elapsed:.1f} emails/s, "
+                f"{FakeSMTPBackend.opened} connections opened"
+            )
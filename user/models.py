@@ -66,6 +66,10 @@ def profile_picture_file_path(instance, filename):
     return os.path.join("uploads/profile/", filename)
 
 
+def full_name(first_name, last_name):
+    return f"{first_name} {last_name}"
+
+
 class Profile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -85,7 +89,7 @@ class Profile(models.Model):
 
     @property
     def full_name(self):
-        return f"{self.first_name} {self.last_name}"
+        return full_name(self.first_name, self.last_name)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.user})"
@@ -1,5 +1,8 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
+from .blacklist import FilteredRefreshToken
 from .models import Profile
 
 
@@ -33,6 +36,10 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
 class LogoutSerializer(serializers.Serializer):
     refresh_token = serializers.CharField()
 
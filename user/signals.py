@@ -0,0 +1,33 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import forget_principal
+from .blacklist import get_blacklist_filter
+from .models import Profile
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_principal(sender, instance, **kwargs):
+    transaction.on_commit(partial(forget_principal, instance.pk))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_principal(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        transaction.on_commit(partial(forget_principal, instance.user_id))
+
+
+# Added before the row is committed: an extra bit is only a false positive,
+# a missing one would let a blacklisted token through.
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    if created:
+        get_blacklist_filter().add(instance.token.jti)
@@ -0,0 +1,47 @@
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from user.blacklist import delete_expired_tokens, rebuild_blacklist_filter
+from user.mail import get_mailer
+
+UPDATE_TIMEOUT = 60
+# The email worker runs a thread pool, which cannot enforce task time
+# limits, so waiting for the message to be sent has to time out by itself.
+EMAIL_TIMEOUT = 60
+
+
+@shared_task(ignore_result=True, soft_time_limit=90, time_limit=120)
+def handle_telegram_update(data) -> None:
+    from user.bot import get_webhook_runner
+
+    get_webhook_runner().process_update(data, timeout=UPDATE_TIMEOUT)
+
+
+# Retried with exponential backoff while the mail server is unreachable.
+@shared_task(
+    ignore_result=True,
+    acks_late=True,
+    autoretry_for=(SMTPException, ConnectionError),
+    retry_backoff=5,
+    retry_backoff_max=120,
+    max_retries=5,
+    soft_time_limit=90,
+    time_limit=120,
+)
+def send_email(subject, body, recipients) -> None:
+    message = EmailMessage(subject, body, settings.EMAIL_HOST_USER, recipients)
+    get_mailer().submit(message).result(EMAIL_TIMEOUT)
+
+
+# Deletes in bounded batches, so a large backlog never holds long locks,
+# and a redelivered run only finds less to delete.
+@shared_task(acks_late=True, soft_time_limit=20 * 60, time_limit=30 * 60)
+def compact_token_blacklist() -> dict:
+    """Drop expired tokens, then rebuild the blacklist filter without them."""
+    return {
+        "deleted": delete_expired_tokens(),
+        "blacklisted": rebuild_blacklist_filter(),
+    }
@@ -4,7 +4,12 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
     TokenVerifyView,
 )
-from .views import CreateUserView, ManageUserView, LogoutView
+from .views import (
+    CreateUserView,
+    ManageUserView,
+    LogoutView,
+    TelegramWebhookView,
+)
 
 
 urlpatterns = [
@@ -14,6 +19,7 @@ urlpatterns = [
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("me/", ManageUserView.as_view(), name="manage"),
     path("logout/", LogoutView.as_view(), name="logout"),
+    path("telegram-webhook/", TelegramWebhookView.as_view(), name="telegram-webhook"),
 ]
 
 app_name = "user"
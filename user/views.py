@@ -1,12 +1,18 @@
+import hmac
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import generics, status, viewsets
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.tokens import RefreshToken
 
+from .authentication import forget_principal
+from .blacklist import FilteredRefreshToken
 from .models import User
 from .serializers import (
     UserSerializer,
@@ -16,6 +22,7 @@ from .serializers import (
     ProfileDetailSerializer,
 )
 from .models import Profile
+from .tasks import handle_telegram_update
 
 from library.permissions import IsCurrentlyLoggedIn, IsAuthenticatedReadOnly
 
@@ -43,6 +50,7 @@ class CreateUserView(generics.CreateAPIView):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
+    # Reads the full user from the database, since it may be saved.
     authentication_classes = (JWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
@@ -64,7 +72,8 @@ class LogoutView(generics.GenericAPIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            RefreshToken(refresh_token).blacklist()
+            FilteredRefreshToken(refresh_token).blacklist()
+            forget_principal(request.user.id)
 
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -123,3 +132,40 @@ class ProfileViewSet(viewsets.ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+
+
+# Telegram redelivers an update until it gets a 2xx answer in time.
+TELEGRAM_UPDATE_TTL = 60 * 60 * 24
+
+
+class TelegramWebhookView(APIView):
+    """Receive bot updates from Telegram and queue them for the handlers.
+
+    Telegram authenticates itself with the secret token given to
+    setWebhook, so the regular authentication and throttling are off.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    @extend_schema(exclude=True)
+    def post(self, request):
+        secret = settings.TELEGRAM["webhook_secret"]
+        received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not secret or not hmac.compare_digest(received, secret):
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        update_id = request.data.get("update_id")
+        if update_id is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        key = f"telegram-update:{update_id}"
+        if cache.add(key, True, TELEGRAM_UPDATE_TTL):
+            try:
+                handle_telegram_update.delay(request.data)
+            except Exception:
+                # Not queued: let Telegram's redelivery of the update through.
+                cache.delete(key)
+                raise
+        return Response(status=status.HTTP_200_OK)